@@ -1,8 +1,23 @@
 import time
+import itertools
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from helpers import *
 from enums import *
 from preprocess import *
 from solution import *
+from compiled import CompiledInstance
+from multistart import MultiStart
+from islands import Islands
+from tempering import ParallelTempering
+from benchmark import run_benchmark
+from budget import Budget
+from tabu import tabu_search
+from alns import alns
+from neighbourhoods import Neighbourhood, apply_move
+from instrumentation import instrumented
+import runlog
 import math
 
 """
@@ -12,6 +27,8 @@ This method contains the main instance processing and modeling logic
 def process(data):
     if not data: return None
 
+    timings = {}
+    instance = timed(timings, 'model', CompiledInstance, data)
     courses, periods, \
     slots_per_day, teachers, \
     constraints, rooms, curricula, \
@@ -26,43 +43,51 @@ def process(data):
     hard_constraints = list(filter(lambda val: val['Level'] == 'Forbidden', constraints))
     period_constraints = list(filter(lambda val: val['Type'] == 'PeriodConstraint', hard_constraints))
     event_period_constraints = list(filter(lambda val: val['Type'] == 'EventPeriodConstraint', hard_constraints))
-    event_room_constraints = list(filter(lambda val: val['Type'] == 'EventRoomConstraint', hard_constraints))
 
     periods = sieve_periods(periods, period_constraints)
-    courses = flat_map_courses(courses)
-    courses = add_possible_rooms(courses, rooms, event_room_constraints)
-    courses = add_possible_periods(courses, periods, event_period_constraints)
-    courses = add_curricula_info(courses, curricula, primary_primary_distance, slots_per_day)
-    courses = add_same_teacher_courses(courses)
-    courses = order_course_by_constraints(courses)
-    courses = group_by_exams_and_parts(courses)
+    courses = timed(timings, 'flatten', flat_map_courses, courses)
+    courses = timed(timings, 'annotate', annotate_courses, courses, rooms, periods, event_period_constraints, curricula, primary_primary_distance, slots_per_day)
+    courses = timed(timings, 'order', order_course_by_constraints, courses)
+    courses = timed(timings, 'group', group_by_exams_and_parts, courses)
     # courses = group_by_course(courses)
 
-    return courses, hard_constraints, constraints
+    instance = timed(timings, 'compile', instance.compile, courses, hard_constraints, constraints)
+    instance.preprocess_timings = timings
+    return instance
 
 """
 Run a greedy search -
 This section contains the main logic to run a greedy search from 
 the initial solution by mutation operators
 """
-def greedy_search(instances, hard_constraints, instance_path, constraints, attempts = 2500):
-    solution = Solution.try_solving(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
+def greedy_search(instance, instance_path, attempts = 2500, budget = None, solution = None):
+    budget = budget or Budget()
+    if solution == None: solution = Solution.try_solving(instance, instance_path=instance_path)
+    if solution == None: return None
 
     best_cost = float('inf')
-    last_solution = solution
 
-    for i in range(0, attempts):
-        mutated_solution = Solution.try_mutating(last_solution)
-        if (mutated_solution == None): continue
+    for i in itertools.count() if budget.bounded() else range(0, attempts):
+        if budget.expired(): break
+        solution.begin()
+        moved = solution.try_move()
+        budget.spend()
+        if not moved:
+            solution.rollback()
+            continue
 
-        # save_solution(instance_path, mutated_solution.export(), True)
+        # save_solution(instance_path, solution.export(), True)
 
-        if (mutated_solution.cost < best_cost):
-            best_cost = mutated_solution.cost
-            last_solution = mutated_solution
+        if (solution.cost < best_cost):
+            solution.commit()
+            best_cost = solution.cost
             if i % 10 == 0:
-                last_solution.validate()
-                print(best_cost, last_solution.validation_results['cost'], last_solution.validation_results['valid'])
+                solution.validate()
+                runlog.validated(solution)
+        else:
+            solution.rollback()
+
+    return solution
 
 """
 Run a simluated annealing search -
@@ -70,12 +95,12 @@ This section contains the main logic to run a simluated annealing search from
 the initial solution by mutation operators
 """
 def sim_annealing(
-    instances, 
-    hard_constraints,
+    instance,
     instance_path,
-    constraints,
     maxsteps=1000,
-    debug=False
+    debug=False,
+    budget=None,
+    solution=None,
 ):
     def acceptance_probability(cost, new_cost, temperature):
         if new_cost < cost:
@@ -86,52 +111,68 @@ def sim_annealing(
     def temperature(fraction):
         return max(0.01, min(1, 1 - fraction))
 
-    state = Solution.try_solving(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
+    budget = budget or Budget()
+    state = solution if solution != None else Solution.try_solving(instance, instance_path=instance_path)
+    if state == None: return None
     cost = state.cost
-    states, costs = [state], [cost]
-    for step in range(maxsteps):
-        fraction = step / float(maxsteps)
+    costs = [cost]
+    best = state.copy()
+    # with a budget the temperature follows the consumed budget instead of the steps
+    for step in itertools.count() if budget.bounded() else range(maxsteps):
+        if budget.expired(): break
+        fraction = budget.progress() if budget.bounded() else step / float(maxsteps)
         T = temperature(fraction)
-        new_state = Solution.try_mutating(state)
-        new_cost = new_state.cost
+        state.begin()
+        moved = state.try_move()
+        budget.spend()
+        if not moved:
+            state.rollback()
+            continue
+        new_cost = state.cost
         if debug: print("Step #{:>2}/{:>2} : T = {:>4.3g}, cost = {:>4.3g}, new_cost = {:>4.3g} ...".format(step, maxsteps, T, cost, new_cost))
         if acceptance_probability(cost, new_cost, T) > random.random():
-            state, cost = new_state, new_cost
-            states.append(state)
+            state.commit()
+            cost = new_cost
             costs.append(cost)
+            if cost < best.cost: best = state.copy()
             if step % 10 == 0:
                 state.validate()
-                print(state.cost, state.validation_results['cost'], state.validation_results['valid'])
-    return state
+                runlog.validated(state)
+        else:
+            state.rollback()
+    return best
 
 """
 Run hill climbing search -
 This section contains the main logic to run a hill climbing search from 
 the initial solution by mutation operators
 """
-def hillclimbing(instances, hard_constraints, instance_path, constraints, old_solution=None):
-    def get_best_neighbour(solution):
-        best_cost = solution.cost
-        best_solution = solution
+def hillclimbing(instance, instance_path, old_solution=None, budget=None, multistart=None):
+    budget = budget or Budget()
+
+    def climb_best_neighbour(solution):
+        improved = False
 
         for i in range(0, 15):
-            mutated_solution = Solution.try_mutating(best_solution)
-            if (mutated_solution == None): continue
-            if (mutated_solution.cost < best_cost):
-                best_cost = mutated_solution.cost
-                best_solution = mutated_solution
-        return best_solution
+            if budget.expired(): break
+            best_cost = solution.cost
+            solution.begin()
+            moved = solution.try_move()
+            budget.spend()
+            if moved and solution.cost < best_cost:
+                solution.commit()
+                improved = True
+            else:
+                solution.rollback()
+        return improved
 
     if old_solution == None:
-        solution = Solution.try_solving(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
+        solution = Solution.try_solving(instance, instance_path=instance_path, multistart=multistart)
     else:
         solution = old_solution
-    neighbour = get_best_neighbour(solution)
-    last_solution = solution
+    if solution == None: return None
 
-    while neighbour.cost < solution.cost:
-        solution = neighbour
-        neighbour = get_best_neighbour(neighbour)
+    while climb_best_neighbour(solution): pass
 
     return solution
 
@@ -141,29 +182,133 @@ This section contains the main logic to run an interated local search from
 the initial solution by mutation operators
 """
 def iterated_local_search(
-    instances, 
-    hard_constraints,
+    instance,
     instance_path,
-    constraints,
     iterations=350,
+    budget=None,
+    multistart=None,
+    solution=None,
 ):
-    best_solution = hillclimbing(instances, hard_constraints, instance_path, constraints, None)
-    best_solutions = []
-
-    for n in range(iterations):
-        mutated_solution = None
-        while mutated_solution == None:
-            mutated_solution = Solution.try_mutating(best_solution)
-
-        local_solution = hillclimbing(None, None, None, None, mutated_solution)
-        if local_solution.cost < best_solution.cost:
-            best_solution = local_solution
-            best_solutions.append(best_solution)
+    budget = budget or Budget()
+    solution = hillclimbing(instance, instance_path, solution, budget, multistart)
+    if solution == None: return None
+    best_cost = solution.cost
+
+    for n in itertools.count() if budget.bounded() else range(iterations):
+        if budget.expired(): break
+        solution.begin()
+        while not solution.try_move():
+            budget.spend()
+            if budget.expired(): break
+        if budget.expired():
+            solution.rollback()
+            break
+        budget.spend()
+
+        hillclimbing(None, None, solution, budget)
+        if solution.cost < best_cost:
+            solution.commit()
+            best_cost = solution.cost
             if n % 3 == 0:
-                best_solution.validate()
-                print(best_solution.cost, best_solution.validation_results['cost'], best_solution.validation_results['valid'])
+                solution.validate()
+                runlog.validated(solution)
+        else:
+            solution.rollback()
     
-    return best_solution
+    return solution
+
+"""
+Run a neighbourhood descent -
+This section contains the main logic to run a descent over the fine-grained
+moves of neighbourhoods.py, accepting the moves that do not worsen the
+cost, and perturbing the solution by mutation operators when it stagnates
+"""
+def neighbourhood_descent(
+    instance,
+    instance_path,
+    iterations=100000,
+    budget=None,
+    multistart=None,
+    stagnation=5000,
+    solution=None,
+):
+    budget = budget or Budget()
+    if solution == None: solution = Solution.try_solving(instance, instance_path=instance_path, multistart=multistart)
+    if solution == None: return None
+    best = solution.copy()
+    neighbourhood = Neighbourhood(solution)
+    neighbourhood.index()
+    last_improvement = 0
+
+    for n in itertools.count() if budget.bounded() else range(iterations):
+        if budget.expired(): break
+        move = next(neighbourhood.sample(1), None)
+        # an empty sample still counts, or an evaluation budget never runs out
+        budget.spend()
+        if move == None: continue
+
+        solution.begin()
+        applied = apply_move(solution, move)
+        # every applied move is reported, like try_move does for the mutations
+        if applied and Solution.observer != None: Solution.observer.moved(solution)
+        if applied and solution.evaluator.cost <= solution.cost:
+            solution.cost = solution.evaluator.cost
+            solution.commit()
+            neighbourhood.index()
+        else:
+            solution.rollback()
+
+        if solution.cost < best.cost:
+            best = solution.copy()
+            last_improvement = n
+        elif n - last_improvement >= stagnation:
+            solution.begin()
+            if solution.try_move(): solution.commit()
+            else: solution.rollback()
+            neighbourhood.index()
+            last_improvement = n
+
+    return best
+
+"""
+Run a late acceptance hill climbing -
+This section contains the main logic to run a late acceptance hill climbing
+from the initial solution by mutation operators. A neighbour is accepted
+when it is no worse than the current solution or than the solution of
+`history` iterations ago, kept in a circular list of costs. The mutations
+being few per second, the history is short
+"""
+def late_acceptance(
+    instance,
+    instance_path,
+    iterations=20000,
+    budget=None,
+    multistart=None,
+    history=20,
+    solution=None,
+):
+    budget = budget or Budget()
+    if solution == None: solution = Solution.try_solving(instance, instance_path=instance_path, multistart=multistart)
+    if solution == None: return None
+    best = solution.copy()
+    costs = [solution.cost] * history
+
+    for n in itertools.count() if budget.bounded() else range(iterations):
+        if budget.expired(): break
+        cost = solution.cost
+        solution.begin()
+        moved = solution.try_move()
+        budget.spend()
+
+        slot = n % history
+        if moved and (solution.cost <= costs[slot] or solution.cost <= cost):
+            solution.commit()
+            if solution.cost < best.cost: best = solution.copy()
+        else:
+            solution.rollback()
+        costs[slot] = solution.cost
+
+    return best
 
 def test_evaluation(solution):
     solution.validate()
@@ -179,43 +324,156 @@ def test_evaluation(solution):
 Solve one instance -
 This section contains the main logic to solve one instance
 """
-def run_solver(instance_path):
+def run_solver(instance_path, seed=None, time_limit=None, workers=None, evaluations=None, instrument=False, profile=None, log=None, algorithm='ils', islands=None, island_algorithms=None, migration_interval=10, replicas=None, exchange_interval=1):
     start_time = time.time()
     tprint("Running solver on instance:", instance_path)
+    if seed != None: random.seed(seed)
 
-    data = parse(instance_path)
-    instances, hard_constraints, constraints = process(data)
-    # save_file("preprocess.json", instances, ".")
+    # the summary, the profile and the run log are written however the run ends
+    with instrumented(instrument, profile), runlog.search_log(log):
+        data = parse(instance_path)
+        instance = process(data)
+        if instance == None: return None
+        stages = ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in instance.preprocess_timings.items())
+        tprint(f"Preprocessed in {sum(instance.preprocess_timings.values()):.2f}s ({stages}).")
+        # save_file("preprocess.json", instance.courses, ".")
 
-    solution = Solution.try_solving(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
-    save_solution(instance_path, solution.export())
+        # constructions run in parallel when more than one worker is given
+        multistart = MultiStart(instance, workers) if workers and workers > 1 else None
+        try:
+            solution = Solution.try_solving(instance, instance_path=instance_path, multistart=multistart)
+            if solution == None: return None
+            save_solution(instance_path, solution.export())
 
-    end_time = time.time()
+            end_time = time.time()
 
-    tprint("Solver completed. Check solutions folder.")
-    tprint(f"Completed in {end_time-start_time:.2f}s.")
-    iterated_local_search(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
-    # hillclimbing(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
-    # greedy_search(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
-    # sim_annealing(instances, hard_constraints, instance_path=instance_path, constraints=constraints)
+            tprint("Solver completed. Check solutions folder.")
+            tprint(f"Completed in {end_time-start_time:.2f}s.")
+            budget = Budget(time_limit, evaluations)
+            with budget.handle_interrupts():
+                if replicas and replicas > 1:
+                    # Metropolis chains at a ladder of temperatures, exchanging their solutions
+                    with ParallelTempering(instance, instance_path, replicas, exchange_interval) as engine:
+                        solution = engine.solve(budget, solution)
+                elif islands and islands > 1:
+                    # independent searches on the cores, exchanging their best solutions
+                    with Islands(instance, instance_path, run_search, island_algorithms or [algorithm], islands, migration_interval) as engine:
+                        solution = engine.solve(budget, solution)
+                else:
+                    solution = ALGORITHMS[algorithm](instance, instance_path, budget, multistart, solution)
+        finally:
+            if multistart != None: multistart.close()
+        # hillclimbing(instance, instance_path=instance_path)
+        # greedy_search(instance, instance_path=instance_path)
+        # sim_annealing(instance, instance_path=instance_path)
+        if solution == None: return None
+        save_solution(instance_path, solution.export())
+        return solution
 
 """
-Solve all instances -
-This section contains the main logic to solve all instances,
-which are present in the instances folder
+Solve all instances in parallel -
+Every instance runs in a worker of a process pool with its own seed and
+time limit, its output and its run log go to the solutions folder and failures
+stay within its result. Results are summarized as they finish
 """
-def solve_all_instances(folder = 'instances'):
-    for _, _, files in os.walk(folder):
-        print("Solving all instances.")
-        for filename in files: run_solver(f'{folder}/{filename}')
+def solve_instance(instance_path, seed, time_limit, evaluations = None):
+    start_time = time.time()
+    name = os.path.basename(instance_path)
+    Path('solutions/logs').mkdir(parents=True, exist_ok=True)
+    result = { 'Instance': name, 'Seed': seed, 'Status': 'solved', 'Cost': None, 'Valid': None }
+
+    with open(f'solutions/logs/{name}.log', 'w') as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            solution = run_solver(instance_path, seed=seed, time_limit=time_limit, evaluations=evaluations, log=f'solutions/logs/{name}.jsonl')
+            if solution == None:
+                result['Status'] = 'unsolved'
+            else:
+                solution.validate()
+                result['Cost'] = solution.cost
+                result['Valid'] = solution.validation_results['valid']
+        except Exception:
+            traceback.print_exc(file=log_file)
+            result['Status'] = 'error'
+
+    result['Time'] = round(time.time() - start_time, 2)
+    return result
+
+def print_summary(results):
+    print(f"{'Instance':<20} {'Status':<9} {'Cost':>8} {'Valid':>6} {'Time':>9} {'Seed':>11}")
+    for r in sorted(results, key=lambda r: r['Instance']):
+        print(f"{r['Instance']:<20} {r['Status']:<9} {str(r['Cost']):>8} {str(r['Valid']):>6} {r['Time']:>8.2f}s {r['Seed']:>11}")
+
+def solve_all_instances_parallel(folder = 'instances', workers = None, time_limit = None, seed = None, evaluations = None):
+    files = [f'{folder}/{f}' for f in os.listdir(folder) if f.endswith('.json')]
+    # the largest instances start first, to balance the workers
+    files.sort(key=os.path.getsize, reverse=True)
+    if seed == None: seed = random.randrange(2**31)
+
+    tprint(f"Solving {len(files)} instances with {workers} workers.")
+    results = []
+    # on Ctrl+C the running workers stop with their best solution and the pending ones are dropped
+    with Budget().handle_interrupts() as budget, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(solve_instance, path, seed + i, time_limit, evaluations): path for i, path in enumerate(files)}
+        for future in as_completed(futures):
+            if budget.interrupted:
+                for pending in futures: pending.cancel()
+            if future.cancelled(): continue
+            try:
+                result = future.result()
+            except Exception:
+                name = os.path.basename(futures[future])
+                result = { 'Instance': name, 'Seed': None, 'Status': 'crashed', 'Cost': None, 'Valid': None, 'Time': 0.0 }
+            results.append(result)
+            tprint(f"{result['Instance']}: {result['Status']}, cost {result['Cost']} in {result['Time']:.2f}s.")
+            save_file('solutions/summary.json', sorted(results, key=lambda r: r['Instance']), 'solutions')
+
+    print_summary(results)
+    return results
+
+"""
+Searches -
+The searches by name, run by the solver, the islands and the benchmark.
+A search starts from the given solution, or from a new construction
+"""
+ALGORITHMS = {
+    'ils': lambda instance, instance_path, budget, multistart = None, solution = None: iterated_local_search(instance, instance_path, budget=budget, multistart=multistart, solution=solution),
+    'sa': lambda instance, instance_path, budget, multistart = None, solution = None: sim_annealing(instance, instance_path, budget=budget, solution=solution),
+    'hillclimbing': lambda instance, instance_path, budget, multistart = None, solution = None: hillclimbing(instance, instance_path, solution, budget, multistart),
+    'greedy': lambda instance, instance_path, budget, multistart = None, solution = None: greedy_search(instance, instance_path, budget=budget, solution=solution),
+    'tabu': lambda instance, instance_path, budget, multistart = None, solution = None: tabu_search(instance, instance_path, budget=budget, multistart=multistart, solution=solution),
+    'descent': lambda instance, instance_path, budget, multistart = None, solution = None: neighbourhood_descent(instance, instance_path, budget=budget, multistart=multistart, solution=solution),
+    'lahc': lambda instance, instance_path, budget, multistart = None, solution = None: late_acceptance(instance, instance_path, budget=budget, multistart=multistart, solution=solution),
+    'alns': lambda instance, instance_path, budget, multistart = None, solution = None: alns(instance, instance_path, budget=budget, multistart=multistart, solution=solution),
+}
+
+# the searches by name for the worker processes, which cannot receive the lambdas
+def run_search(algorithm, instance, instance_path, budget, multistart = None, solution = None):
+    return ALGORITHMS[algorithm](instance, instance_path, budget, multistart, solution)
+
+"""
+Benchmark -
+Runs one of the searches over the given instances with fixed seeds and
+time limits, see benchmark.py
+"""
+def benchmark(options):
+    instances = options.instances or sorted(f'instances/{f}' for f in os.listdir('instances') if f.endswith('.json'))
+    search = ALGORITHMS[options.algorithm]
+    time_limit = options.time_limit or None
+    run_benchmark(search, options.algorithm, instances, process, options.seeds, time_limit, options.evaluations, options.output, options.quiet)
 
 """
 Main program -
 This section runs the solver
 """
 def main():
-    if solve_all_arg(): solve_all_instances()
-    else: run_solver(get_filepath())
+    if benchmark_arg(): benchmark(benchmark_options())
+    elif solve_all_arg():
+        options = batch_options()
+        solve_all_instances_parallel(options.folder, options.workers, options.time_limit, options.seed, options.evaluations)
+    else:
+        options = solver_options()
+        run_solver(options.instance, options.seed, options.time_limit, options.workers, options.evaluations, options.instrument, options.profile, options.log, options.algorithm,
+            options.islands, options.island_algorithms, options.migration_interval, options.replicas, options.exchange_interval)
 
 """
 Execution
@@ -0,0 +1,241 @@
+import time
+import random
+import itertools
+from solution import Solution
+from budget import Budget
+from enums import NO_ROOM
+
+"""
+Adaptive large neighbourhood search -
+Every iteration removes some courses with a destroy operator and inserts
+their events back with a repair operator, keeping the result when it is no
+worse. The events of a course are inserted in their compiled order, each
+after the period of the previous one, so the precedences hold. The
+operators are drawn by their weights, which follow the improvement every
+operator brings per CPU second: at the end of every segment of iterations
+a weight moves by `reaction` towards its operator's improvement per second
+in the segment, never falling below `floor` of the largest one
+"""
+def destroy_size(solution, smallest = 2, largest = 0.1):
+    return min(len(solution.courses), random.randint(smallest, max(smallest, int(len(solution.courses) * largest))))
+
+def related_courses(solution, course, related, size):
+    placed = set(solution.courses)
+    courses = [c for c in related if c != course and c in placed]
+    random.shuffle(courses)
+    return [course] + courses[:size - 1]
+
+"""
+Destroy operators -
+The courses to remove, as course ids
+"""
+def random_courses(solution, size):
+    return random.sample(solution.courses, size)
+
+# a course and the courses of its curricula
+def same_curriculum(solution, size):
+    instance = solution.instance
+    course = random.choice(solution.courses)
+    related = instance.course_primaries[course] | instance.course_primary_secondaries[course] | instance.course_secondaries[course]
+    return related_courses(solution, course, related, size)
+
+# a course and the courses of its teacher
+def same_teacher(solution, size):
+    instance = solution.instance
+    course = random.choice(solution.courses)
+    names = instance.events[instance.course_events[course][0]]['SameTeacherCourses']
+    return related_courses(solution, course, [instance.course_ids[name] for name in names], size)
+
+# the courses with an event in a window of periods, about a day long
+def same_window(solution, size):
+    instance = solution.instance
+    start = random.randrange(instance.periods)
+    end = start + instance.slots_per_day
+    courses = set(
+        instance.event_courses[event]
+        for event, period in enumerate(solution.event_periods) if start <= period < end
+    )
+    courses = list(courses)
+    random.shuffle(courses)
+    return courses[:size]
+
+# the most expensive courses, drawn with a bias towards the first ones
+def worst_courses(solution, size, bias = 3):
+    evaluator = solution.evaluator
+    ranked = sorted(solution.courses, key=evaluator.course_cost, reverse=True)
+    chosen = []
+    while len(chosen) < size:
+        chosen.append(ranked.pop(int(len(ranked) * random.random() ** bias)))
+    return chosen
+
+DESTROY = {
+    'random': random_courses,
+    'curriculum': same_curriculum,
+    'teacher': same_teacher,
+    'window': same_window,
+    'worst': worst_courses,
+}
+
+def destroy(solution, courses):
+    for course in courses:
+        for event in solution.course_events(course):
+            if solution.event_rooms[event] != NO_ROOM:
+                solution.release_room(solution.event_periods[event], solution.event_rooms[event])
+        solution.remove_course(course)
+
+"""
+Insertions -
+The feasible (period, room) of an unplaced event, the previous events of
+its course being placed, and the cost of the solution with the event there
+"""
+def insertions(solution, event, periods):
+    lower, _ = solution.period_window(event)
+    for period in periods:
+        if period <= lower or not solution.can_host(event, period): continue
+        room = solution.cheapest_room(event, period)
+        if room != None: yield period, room
+
+def insertion_cost(solution, event, period, room):
+    solution.event_periods[event] = period
+    solution.event_rooms[event] = room
+    solution.evaluator.add_event(event)
+    cost = solution.evaluator.cost
+    solution.remove_event(event)
+    return cost
+
+# at most `candidates` insertions of the event, with their costs, cheapest first
+def scored_insertions(solution, event, domains, candidates):
+    found = list(insertions(solution, event, domains[event]))
+    if len(found) > candidates: found = random.sample(found, candidates)
+    scored = [(insertion_cost(solution, event, period, room), period, room) for period, room in found]
+    scored.sort()
+    return scored
+
+def insert(solution, event, period, room):
+    if room != NO_ROOM: solution.take_room(period, room)
+    solution.add_event(event, period, room)
+
+"""
+Repair operators -
+Insert the events of the removed courses, the next event of every course
+being ready once the previous one is placed. They return False when an
+event has no feasible insertion left
+"""
+# the first feasible insertion, in a random order of the periods
+def first_fit(solution, pending, domains, candidates):
+    for events in pending:
+        for event in events:
+            periods = random.sample(domains[event], len(domains[event]))
+            found = next(insertions(solution, event, periods), None)
+            if found == None: return False
+            insert(solution, event, *found)
+    return True
+
+def best_insertion(solution, pending, domains, candidates):
+    for events in pending:
+        for event in events:
+            scored = scored_insertions(solution, event, domains, candidates)
+            if len(scored) == 0: return False
+            _, period, room = scored[0]
+            insert(solution, event, period, room)
+    return True
+
+# the ready event with the largest difference between its best and second
+# best insertions goes first, an event with a single insertion before all
+def regret_insertion(solution, pending, domains, candidates):
+    pending = [list(events) for events in pending]
+    while len(pending) > 0:
+        chosen = None
+        for events in pending:
+            scored = scored_insertions(solution, events[0], domains, candidates)
+            if len(scored) == 0: return False
+            regret = scored[1][0] - scored[0][0] if len(scored) > 1 else float('inf')
+            if chosen == None or regret > chosen[0]: chosen = (regret, events, scored[0])
+        _, events, (_, period, room) = chosen
+        insert(solution, events.pop(0), period, room)
+        if len(events) == 0: pending.remove(events)
+    return True
+
+REPAIR = {
+    'first-fit': first_fit,
+    'best': best_insertion,
+    'regret': regret_insertion,
+}
+
+class Weights:
+    def __init__(self, names, reaction = 0.3, floor = 0.05):
+        self.names = list(names)
+        self.weights = { name: 1.0 for name in self.names }
+        self.reaction = reaction
+        self.floor = floor
+        self.reset()
+
+    def reset(self):
+        self.improvements = { name: 0 for name in self.names }
+        self.seconds = { name: 0.0 for name in self.names }
+
+    def choose(self):
+        return random.choices(self.names, [self.weights[name] for name in self.names])[0]
+
+    def record(self, name, improvement, seconds):
+        self.improvements[name] += improvement
+        self.seconds[name] += seconds
+
+    # the operators not used in the segment keep their weights
+    def update(self):
+        for name in self.names:
+            if self.seconds[name] == 0: continue
+            rate = self.improvements[name] / self.seconds[name]
+            self.weights[name] = (1 - self.reaction) * self.weights[name] + self.reaction * rate
+        largest = max(self.weights.values())
+        for name in self.names:
+            self.weights[name] = max(self.weights[name], largest * self.floor, 1e-9)
+        self.reset()
+
+def alns(
+    instance,
+    instance_path,
+    iterations=5000,
+    budget=None,
+    multistart=None,
+    segment=50,
+    candidates=20,
+    solution=None,
+):
+    budget = budget or Budget()
+    if solution == None: solution = Solution.try_solving(instance, instance_path=instance_path, multistart=multistart)
+    if solution == None: return None
+    best = solution.copy()
+    domains = [event['PossiblePeriods'] for event in instance.events]
+    destroys, repairs = Weights(DESTROY), Weights(REPAIR)
+
+    for n in itertools.count() if budget.bounded() else range(iterations):
+        if budget.expired(): break
+        destroy_name, repair_name = destroys.choose(), repairs.choose()
+        start_time = time.process_time()
+        cost = solution.cost
+
+        solution.begin()
+        courses = DESTROY[destroy_name](solution, destroy_size(solution))
+        destroy(solution, courses)
+        pending = [instance.course_events[course] for course in courses]
+        random.shuffle(pending)
+        repaired = REPAIR[repair_name](solution, pending, domains, candidates)
+        budget.spend()
+        if Solution.observer != None: Solution.observer.moved(solution)
+
+        if repaired and solution.evaluator.cost <= cost:
+            solution.cost = solution.evaluator.cost
+            solution.commit()
+            if solution.cost < best.cost: best = solution.copy()
+        else:
+            solution.rollback()
+
+        seconds = time.process_time() - start_time
+        destroys.record(destroy_name, cost - solution.cost, seconds)
+        repairs.record(repair_name, cost - solution.cost, seconds)
+        if (n + 1) % segment == 0:
+            destroys.update()
+            repairs.update()
+
+    return best
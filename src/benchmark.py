@@ -0,0 +1,114 @@
+import os
+import time
+import contextlib
+import random
+import platform
+import subprocess
+from helpers import read_file, save_file, parse, tprint
+from solution import Solution
+from budget import Budget
+
+"""
+Benchmark -
+This section contains the benchmark harness, which runs a search over
+instances with fixed seeds and time limits and compares the results with
+the best known costs of data/best-existing-solutions.json
+"""
+def best_known_costs(filepath = 'data/best-existing-solutions.json'):
+    data = read_file(filepath) or {}
+    return { name.replace('SOLUTION-', '', 1): cost for name, cost in data.items() }
+
+def current_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+class Recorder:
+    def __init__(self):
+        self.start_time = time.time()
+        self.first_feasible = None
+        self.moves = 0
+        self.best_cost = None
+        self.trace = []
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def constructed(self, solution):
+        if self.first_feasible == None: self.first_feasible = self.elapsed()
+        self.accepted(solution)
+
+    def moved(self, solution):
+        self.moves += 1
+
+    # the trace is the best cost over time
+    def accepted(self, solution):
+        if self.best_cost == None or solution.cost < self.best_cost:
+            self.best_cost = solution.cost
+            self.trace.append([round(self.elapsed(), 3), solution.cost])
+
+def benchmark_run(search, instance, instance_path, seed, time_limit, evaluations, best_known, quiet = False):
+    random.seed(seed)
+    recorder = Recorder()
+    budget = Budget(time_limit, evaluations)
+    Solution.observer = recorder
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, 'w')) if quiet else contextlib.nullcontext(), budget.handle_interrupts():
+            solution = search(instance, instance_path, budget)
+    finally:
+        Solution.observer = None
+    elapsed = recorder.elapsed()
+
+    result = {
+        'Instance': os.path.basename(instance_path),
+        'Seed': seed,
+        'Cost': None,
+        'Valid': None,
+        'BestKnown': best_known,
+        'Difference': None,
+        'Gap': None,
+        'TimeToFirstFeasible': recorder.first_feasible and round(recorder.first_feasible, 3),
+        'Moves': recorder.moves,
+        'Evaluations': budget.spent,
+        'Interrupted': budget.interrupted,
+        'MovesPerSecond': round(recorder.moves / elapsed, 2) if elapsed > 0 else None,
+        'Time': round(elapsed, 3),
+        'Trace': recorder.trace,
+    }
+    if solution != None:
+        solution.validate()
+        result['Cost'] = solution.cost
+        result['Valid'] = solution.validation_results['valid']
+        if best_known != None: result['Difference'] = solution.cost - best_known
+        if best_known: result['Gap'] = round((solution.cost - best_known) / best_known, 4)
+    return result
+
+def run_benchmark(search, algorithm, instance_paths, process, seeds, time_limit, evaluations = None, output = None, quiet = False):
+    best_costs = best_known_costs()
+    commit = current_commit()
+    results = []
+
+    for instance_path in instance_paths:
+        instance = process(parse(instance_path))
+        best_known = best_costs.get(os.path.basename(instance_path))
+        for seed in seeds:
+            result = benchmark_run(search, instance, instance_path, seed, time_limit, evaluations, best_known, quiet)
+            tprint(f"{result['Instance']} seed {seed}: cost {result['Cost']} (best known {best_known}), {result['MovesPerSecond']} moves/s")
+            results.append(result)
+
+    report = {
+        'Algorithm': algorithm,
+        'Commit': commit,
+        'Python': f'{platform.python_implementation()} {platform.python_version()}',
+        'Date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'TimeLimit': time_limit,
+        'EvaluationLimit': evaluations,
+        'Seeds': seeds,
+        'Results': results,
+    }
+    output = output or f"benchmarks/{algorithm}-{commit or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    save_file(output, report, os.path.dirname(output) or '.')
+    tprint(f"Benchmark written to {output}.")
+    return report
@@ -0,0 +1,63 @@
+import time
+import signal
+import threading
+import contextlib
+
+"""
+Search budget -
+A wall-clock and evaluation-count limit shared by the searches. Every
+search checks expired() between moves and returns its best solution when
+the budget runs out, or when the run is interrupted with Ctrl+C
+"""
+class Budget:
+    def __init__(self, time_limit = None, evaluations = None):
+        self.start_time = time.time()
+        self.time_limit = time_limit
+        self.deadline = None if time_limit == None else self.start_time + time_limit
+        self.evaluations = evaluations
+        self.spent = 0
+        self.interrupted = False
+
+    def spend(self, evaluations = 1):
+        self.spent += evaluations
+
+    def bounded(self):
+        return self.deadline != None or self.evaluations != None
+
+    def expired(self):
+        if self.interrupted: return True
+        if self.deadline != None and time.time() >= self.deadline: return True
+        if self.evaluations != None and self.spent >= self.evaluations: return True
+        return False
+
+    # the consumed fraction of the budget, 0 when unbounded
+    def progress(self):
+        fractions = [0]
+        if self.deadline != None:
+            fractions.append((time.time() - self.start_time) / self.time_limit if self.time_limit > 0 else 1)
+        if self.evaluations != None:
+            fractions.append(self.spent / self.evaluations if self.evaluations > 0 else 1)
+        return min(1, max(fractions))
+
+    """
+    Interrupts -
+    Within this context the first Ctrl+C only expires the budget, so that
+    the search stops at its next move with its best solution. A second one
+    interrupts as usual
+    """
+    @contextlib.contextmanager
+    def handle_interrupts(self):
+        if threading.current_thread() is not threading.main_thread():
+            yield self
+            return
+
+        def interrupt(signum, frame):
+            self.interrupted = True
+            signal.signal(signal.SIGINT, previous)
+            print("\nInterrupted, stopping with the best solution so far.")
+
+        previous = signal.signal(signal.SIGINT, interrupt)
+        try:
+            yield self
+        finally:
+            signal.signal(signal.SIGINT, previous)
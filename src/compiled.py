@@ -0,0 +1,199 @@
+from collections import defaultdict
+from evaluation import is_first_exam, PRIMARY_PRIMARY_DISTANCE_WEIGHT, PRIMARY_SECONDARY_DISTANCE_WEIGHT, \
+    UNDESIRED_PERIOD_WEIGHT, INDIFFERENT_PERIOD_WEIGHT, UNDESIRED_ROOM_WEIGHT, INDIFFERENT_ROOM_WEIGHT
+from enums import NO_ROOM
+
+"""
+Compiled instance -
+This section contains the integer model of an instance, shared by the
+solver and the evaluation. The validator keeps its own instance loader, so
+that it stays an independent check of the solutions. Events, courses and
+rooms are numbered in the order of the instance file, events as course,
+exam and part (the order used by the validator), and every relation the hot
+loops need is resolved once into id lists, sets and bitmasks.
+"""
+class CompiledInstance:
+    def __init__(self, data):
+        self.periods = data['Periods']
+        self.slots_per_day = data['SlotsPerDay']
+        self.primary_primary_distance = data.get('PrimaryPrimaryDistance')
+
+        self.room_names = [room['Room'] for room in data['Rooms']]
+        self.room_ids = {name: index for index, name in enumerate(self.room_names)}
+        self.room_members = []
+        self.room_masks = []
+        for index, room in enumerate(data['Rooms']):
+            if room.get('Members'):
+                members = [self.room_ids[member] for member in room['Members']]
+            else:
+                members = [index]
+            self.room_members.append(members)
+            self.room_masks.append(sum(1 << member for member in set(members)))
+
+        self.course_names = [course['Course'] for course in data['Courses']]
+        self.course_ids = {name: index for index, name in enumerate(self.course_names)}
+        self.event_ids = {}
+        self.event_keys = []
+        for course in data['Courses']:
+            for exam in range(course['NumberOfExams']):
+                for part in course['ExamType'].split('And'):
+                    self.event_ids[(course['Course'], exam, part)] = len(self.event_keys)
+                    self.event_keys.append((course['Course'], exam, part))
+
+        self.forbidden_rooms = defaultdict(set)
+        for c in data['Constraints']:
+            if c['Type'] == 'RoomPeriodConstraint' and c['Level'] == 'Forbidden':
+                self.forbidden_rooms[c['Period']].add(self.room_ids[c['Room']])
+        # a roomset is not available when one of its members is not
+        for period, rooms in self.forbidden_rooms.items():
+            for index, members in enumerate(self.room_members):
+                if any(member in rooms for member in members):
+                    rooms.add(index)
+
+    """
+    Attach the preprocessed courses -
+    Every course (event) dictionary gets its event id, course id and the ids
+    of its possible rooms, and the curricula and teacher relations are turned
+    into course id adjacency lists
+    """
+    def compile(self, courses, hard_constraints, constraints):
+        self.courses = courses
+        self.hard_constraints = hard_constraints
+        self.constraints = constraints
+        self.events = [None] * len(self.event_keys)
+
+        for group in courses:
+            for course in group:
+                event = self.event_ids[(course['Course'], course['ExamOrder'], course['ExamType'])]
+                course['Event'] = event
+                course['CourseId'] = self.course_ids[course['Course']]
+                course['Rooms'] = [self.room_id(room) for room in course['PossibleRooms']]
+                self.events[event] = course
+
+        self.event_courses = [self.course_ids[course] for course, _, _ in self.event_keys]
+        self.course_events = [[] for _ in self.course_names]
+        for event, course in enumerate(self.event_courses):
+            self.course_events[course].append(event)
+
+        def ids(names):
+            return set(self.course_ids[name] for name in names)
+
+        self.course_conflicts = [set() for _ in self.course_names]
+        self.course_primaries = [set() for _ in self.course_names]
+        self.course_primary_secondaries = [set() for _ in self.course_names]
+        self.course_secondaries = [set() for _ in self.course_names]
+        for course in self.events:
+            course_id = course['CourseId']
+            self.course_primaries[course_id] = ids(course['PrimaryCourses'])
+            self.course_primary_secondaries[course_id] = ids(course['PrimarySecondaryCourses'])
+            # secondary conflicts only count when there is no primary/secondary one
+            self.course_secondaries[course_id] = ids(course['SecondaryCourses']) - self.course_primary_secondaries[course_id]
+            self.course_conflicts[course_id] = self.course_primaries[course_id] | ids(course['SameTeacherCourses'])
+        self.course_distances = [
+            primaries | primary_secondaries
+            for primaries, primary_secondaries in zip(self.course_primaries, self.course_primary_secondaries)
+        ]
+
+        # hard conflicts (curricula and teachers) as one bitmask per course
+        self.conflict_masks = [sum(1 << c for c in conflicts) for conflicts in self.course_conflicts]
+        # soft conflicts, counted with the courses scheduled in a period
+        self.primary_secondary_masks = [sum(1 << c for c in courses) for courses in self.course_primary_secondaries]
+        self.secondary_masks = [sum(1 << c for c in courses) for courses in self.course_secondaries]
+        self.forbidden_masks = [0] * self.periods
+        for period, rooms in self.forbidden_rooms.items():
+            self.forbidden_masks[period] = sum(1 << room for room in rooms)
+
+        self.compile_preferences(constraints)
+        self.compile_distances()
+        return self
+
+    """
+    Distance pairs -
+    The curricula distance constraints as one deduplicated list of
+    (event, event, minimum distance, weight), for the first exams of every
+    pair of primary or primary/secondary courses, also grouped by course
+    pair. A pair in both relations only counts its primary distance, which
+    is never shorter than the primary/secondary one
+    """
+    def compile_distances(self):
+        self.distance_pairs = []
+        self.course_distance_pairs = {}
+
+        for one, others in enumerate(self.course_distances):
+            for two in others:
+                if two < one: continue
+                pairs = []
+                for first in self.course_events[one]:
+                    course = self.events[first]
+                    if not is_first_exam(course): continue
+                    if two in self.course_primaries[one]:
+                        min_distance = course.get('PrimaryPrimaryDistance') or 2 * course['SlotsPerDay']
+                        weight = PRIMARY_PRIMARY_DISTANCE_WEIGHT
+                    else:
+                        min_distance = course.get('PrimarySecondaryDistance') or course['SlotsPerDay']
+                        weight = PRIMARY_SECONDARY_DISTANCE_WEIGHT
+                    for second in self.course_events[two]:
+                        if not is_first_exam(self.events[second]): continue
+                        pairs.append((first, second, min_distance, weight))
+                if len(pairs) == 0: continue
+                self.course_distance_pairs[(one, two)] = pairs
+                self.distance_pairs.extend(pairs)
+
+    """
+    Preference tables -
+    The soft room and period constraints as dense per event penalty rows,
+    event_period_costs[event][period] and event_room_costs[event][room],
+    so that scoring an event is two reads. The last room entry, NO_ROOM,
+    is the cost of an event without a room
+    """
+    def compile_preferences(self, constraints):
+        undesired_periods = set()
+        undesired_rooms = [set() for _ in self.events]
+        preferred_rooms = [None] * len(self.events)
+        undesired_event_periods = [set() for _ in self.events]
+        preferred_periods = [None] * len(self.events)
+
+        tables = {
+            ('Undesired', 'EventRoomConstraint'): (undesired_rooms, 'Room'),
+            ('Preferred', 'EventRoomConstraint'): (preferred_rooms, 'Room'),
+            ('Undesired', 'EventPeriodConstraint'): (undesired_event_periods, 'Period'),
+            ('Preferred', 'EventPeriodConstraint'): (preferred_periods, 'Period'),
+        }
+
+        for c in constraints:
+            if c['Level'] == 'Undesired' and c['Type'] == 'PeriodConstraint':
+                undesired_periods.add(c['Period'])
+            if (c['Level'], c['Type']) not in tables: continue
+            table, value = tables[(c['Level'], c['Type'])]
+            value = self.room_ids[c[value]] if value == 'Room' else c[value]
+            parts = [c['Part']] if c.get('Part') != None else ['Written', 'Oral']
+            for part in parts:
+                event = self.event_ids.get((c['Course'], c['Exam'], part))
+                if event == None: continue
+                if table[event] == None: table[event] = set()
+                table[event].add(value)
+
+        self.event_period_costs = []
+        self.event_room_costs = []
+        for event in range(len(self.events)):
+            costs = [0] * self.periods
+            for period in range(self.periods):
+                if period in undesired_event_periods[event]: costs[period] += UNDESIRED_PERIOD_WEIGHT
+                if preferred_periods[event] != None and period not in preferred_periods[event]:
+                    costs[period] += INDIFFERENT_PERIOD_WEIGHT
+                if period in undesired_periods: costs[period] += UNDESIRED_PERIOD_WEIGHT
+            self.event_period_costs.append(costs)
+
+            costs = [0] * (len(self.room_names) + 1)
+            for room in range(len(costs)):
+                if room in undesired_rooms[event]: costs[room] += UNDESIRED_ROOM_WEIGHT
+                if preferred_rooms[event] != None and room not in preferred_rooms[event]:
+                    costs[room] += INDIFFERENT_ROOM_WEIGHT
+            self.event_room_costs.append(costs)
+
+    def room_id(self, room):
+        return self.room_ids[room.split(':')[0]]
+
+    def room_name(self, room):
+        if room == None or room == NO_ROOM: return None
+        return self.room_names[room]
@@ -1,3 +1,7 @@
+# the period of an event not placed yet, the room of an event without one
+NO_PERIOD = -1
+NO_ROOM = -1
+
 def room2supervisors(enum):
     if not enum: return None
     return {
@@ -1,5 +1,6 @@
+import copy
 from collections import defaultdict
-from helpers import flatten
+from enums import NO_PERIOD
 
 UNDESIRED_PERIOD_WEIGHT = 10
 INDIFFERENT_PERIOD_WEIGHT = 2
@@ -16,107 +17,75 @@ SECONDARY_SECONDARY_CONFLICT_WEIGHT = 1
 SECONDARY_SECONDARY_DISTANCE_WEIGHT = 1
 
 
+# the placed events of a course, in the order of the instance (the order
+# they are placed in, written before oral and exam after exam)
+def placed_events(instance, periods, course):
+  return [event for event in instance.course_events[course] if periods[event] != NO_PERIOD]
+
 # UNDESIRED_PERIOD_WEIGHT
 # INDIFFERENT_PERIOD_WEIGHT
 # UNDESIRED_ROOM_WEIGHT
 # INDIFFERENT_ROOM_WEIGHT
-def room_and_period_costs(assignments, undesired, preferred):
+def event_preference_cost(instance, event, period, room):
+  return instance.event_period_costs[event][period] + instance.event_room_costs[event][room]
+
+def room_and_period_costs(solution):
   cost = 0
-  constraints = defaultdict(dict)
-  undesired_periods = list(filter(lambda val: val['Type'] == 'PeriodConstraint', undesired))
-  undesired_periods = list(map(lambda x: x.get('Period'), undesired_periods))
-  undesired_er = list(filter(lambda val: val['Type'] == 'EventRoomConstraint', undesired))
-  preferred_er = list(filter(lambda val: val['Type'] == 'EventRoomConstraint', preferred))
-  undesired_ep = list(filter(lambda val: val['Type'] == 'EventPeriodConstraint', undesired))
-  preferred_ep= list(filter(lambda val: val['Type'] == 'EventPeriodConstraint', preferred))
-
-  def fill_constraints(c, constraint_type, value):
-    key = f"{c['Course']}:{c['Exam']}"
-    if c.get('Part') != None: 
-      key = f"{key}:{c['Part']}"
-      if constraints[constraint_type].get(key, None) == None:
-        constraints[constraint_type][key] = []
-      constraints[constraint_type][key].append(c[value])
-    else:
-      if constraints[constraint_type].get(f"{key}:Written", None) == None:
-        constraints[constraint_type][f"{key}:Written"] = []
-      if constraints[constraint_type].get(f"{key}:Oral", None) == None:
-        constraints[constraint_type][f"{key}:Oral"] = []
-      constraints[constraint_type][f"{key}:Written"].append(c[value])
-      constraints[constraint_type][f"{key}:Oral"].append(c[value])
-
-  for c in undesired_er:
-    fill_constraints(c, 'UndesiredEventRoomConstraint', 'Room')
-  for c in preferred_er:
-    fill_constraints(c, 'PreferredEventRoomConstraint', 'Room')
-  for c in undesired_ep:
-    fill_constraints(c, 'UndesiredEventPeriodConstraint', 'Period')
-  for c in preferred_ep:
-    fill_constraints(c, 'PreferredEventPeriodConstraint', 'Period')
-
-  def match_event_to_constraint(event, contraint_type, match_value, equal = True):
-    key = f"{event.course}:{event.exam}"
-    if event.part != None: key = f"{key}:{event.part}"
-    else: key = f"{key}:Written"
-    value = constraints[contraint_type].get(key, None)
-    return value != None and ((match_value in value and equal) or (match_value not in value and not equal))
-
-  def undesired_er_match(event):
-    return match_event_to_constraint(event, 'UndesiredEventRoomConstraint', event.room, True)
-
-  def preferred_er_not_match(event):
-    return match_event_to_constraint(event, 'PreferredEventRoomConstraint', event.room, False)
-
-  def undesired_ep_match(event):
-    return match_event_to_constraint(event, 'UndesiredEventPeriodConstraint', event.period, True)
-
-  def preferred_ep_not_match(event):
-    return match_event_to_constraint(event, 'PreferredEventPeriodConstraint', event.period, False)
-
-  for assignment in assignments:
-    for event in assignment.events:
-      if undesired_er_match(event):
-        cost += UNDESIRED_ROOM_WEIGHT
-      if preferred_er_not_match(event):
-        cost += INDIFFERENT_ROOM_WEIGHT
-      if undesired_ep_match(event):
-        cost += UNDESIRED_PERIOD_WEIGHT
-      if preferred_ep_not_match(event):
-        cost += INDIFFERENT_PERIOD_WEIGHT
-      if event.period in undesired_periods:
-        cost += UNDESIRED_PERIOD_WEIGHT
+  instance, periods, rooms = solution.instance, solution.event_periods, solution.event_rooms
+
+  for event, period in enumerate(periods):
+    if period == NO_PERIOD: continue
+    cost += event_preference_cost(instance, event, period, rooms[event])
   return cost
 
 
 # WRITTEN_ORAL_DISTANCE_WEIGHT
-def written_oral_distance(assignments):
+def written_oral_distance(solution):
+  cost = 0
+
+  for course in solution.courses:
+    events = placed_events(solution.instance, solution.event_periods, course)
+    cost += course_written_oral_distance(solution.instance, events, solution.event_periods)
+
+  return cost
+
+def course_written_oral_distance(instance, events, periods):
   cost = 0
-  two_part_courses = list(filter(lambda val: val.events[0].course_metadata.get('WrittenOralSpecs', None), assignments))
+  written_oral_specs = instance.events[events[0]].get('WrittenOralSpecs')
+  if not written_oral_specs: return cost
 
-  for assignment in two_part_courses:
-    written_oral_specs = assignment.events[0].course_metadata.get('WrittenOralSpecs')
-    for eventIndex in range(0, len(assignment.events), 2):
-      distance = assignment.events[eventIndex + 1].period - assignment.events[eventIndex].period
-      if distance < int(written_oral_specs['MinDistance']):
-        cost += abs(written_oral_specs['MinDistance'] - distance) * WRITTEN_ORAL_DISTANCE_WEIGHT
-      elif distance > int(written_oral_specs['MaxDistance']):
-        cost += abs(distance - written_oral_specs['MaxDistance']) * WRITTEN_ORAL_DISTANCE_WEIGHT
+  # a written part without its oral (while a course is being placed) has no distance yet
+  for eventIndex in range(0, len(events) - 1, 2):
+    distance = periods[events[eventIndex + 1]] - periods[events[eventIndex]]
+    if distance < int(written_oral_specs['MinDistance']):
+      cost += abs(written_oral_specs['MinDistance'] - distance) * WRITTEN_ORAL_DISTANCE_WEIGHT
+    elif distance > int(written_oral_specs['MaxDistance']):
+      cost += abs(distance - written_oral_specs['MaxDistance']) * WRITTEN_ORAL_DISTANCE_WEIGHT
 
   return cost
 
 
 # SAME_COURSE_DISTANCE_WEIGHT
-def same_course_distance(assignments):
+def same_course_distance(solution):
+  cost = 0
+
+  for course in solution.courses:
+    events = placed_events(solution.instance, solution.event_periods, course)
+    cost += course_same_course_distance(solution.instance, events, solution.event_periods)
+
+  return cost
+
+def course_same_course_distance(instance, events, periods):
   cost = 0
-  repeated_courses = list(filter(lambda val: val.events[0].course_metadata.get('MultipleExams'), assignments))
+  course = instance.events[events[0]]
+  if not course.get('MultipleExams'): return cost
 
-  for assignment in repeated_courses:
-    step = 2 if assignment.events[0].course_metadata.get('WrittenOralSpecs') else 1
-    course_minimum_distance_between_exams = assignment.events[0].course_metadata.get('MinimumDistanceBetweenExams')
-    for eventIndex in range(0, len(assignment.events) - step, step):
-      distance_between_exams = assignment.events[eventIndex + step].period - assignment.events[eventIndex].period
-      if int(distance_between_exams) < int(course_minimum_distance_between_exams):
-        cost += abs(course_minimum_distance_between_exams - distance_between_exams) * SAME_COURSE_DISTANCE_WEIGHT
+  step = 2 if course.get('WrittenOralSpecs') else 1
+  course_minimum_distance_between_exams = course.get('MinimumDistanceBetweenExams')
+  for eventIndex in range(0, len(events) - step, step):
+    distance_between_exams = periods[events[eventIndex + step]] - periods[events[eventIndex]]
+    if int(distance_between_exams) < int(course_minimum_distance_between_exams):
+      cost += abs(course_minimum_distance_between_exams - distance_between_exams) * SAME_COURSE_DISTANCE_WEIGHT
 
   return cost
 
@@ -124,112 +93,169 @@ def same_course_distance(assignments):
 # SECONDARY_SECONDARY_CONFLICT_WEIGHT
 def primary_secondary_conflict(solution):
   cost = 0
+  instance = solution.instance
+  period_masks = defaultdict(int)
 
-  visited_conflicts = defaultdict(dict)
-
-  for assignment in solution.assignments:
-    for event in assignment.events:
-      period = event.period
-      course = event.course_metadata
-      course_name = course['Course']
-      no_room_courses = solution.taken_period_room.get(period, {}).get('noRoom', [])
-      period_courses = solution.taken_period_room.get(period, {}).values()
-
-      conflict_courses = []
-      conflict_courses.extend(period_courses)
-      conflict_courses.extend(no_room_courses)
-      conflict_courses = flatten(conflict_courses)
-
-      conflicting_ps = list(set(list(set(conflict_courses) & set(course["PrimarySecondaryCourses"]))))
-      conflicting_ss = list(set(list(set(conflict_courses) & set(course["SecondaryCourses"]))))
-      primary_secondary_course_conflicts = len(conflicting_ps)
-      secondary_course_conflicts = len(conflicting_ss)
-
-      for conflict in conflicting_ps:
-        if (visited_conflicts.get(f"{conflict}:{course_name}", False) == True): continue
-        visited_conflicts[f"{course_name}:{conflict}"] = True
-        cost += PRIMARY_SECONDARY_CONFLICT_WEIGHT
-
-      for conflict in conflicting_ss:
-        if (conflict in conflicting_ps or course_name in conflicting_ss): continue
-        if (visited_conflicts.get(f"{conflict}:{course_name}", False) == True): continue
-        visited_conflicts[f"{course_name}:{conflict}"] = True
-        cost += SECONDARY_SECONDARY_CONFLICT_WEIGHT
+  for event, period in enumerate(solution.event_periods):
+    if period == NO_PERIOD: continue
+    course = instance.event_courses[event]
+    courses = period_masks[period]
+    if courses >> course & 1: continue
+    cost += period_conflicts(instance, courses, course)
+    period_masks[period] = courses | 1 << course
 
   return cost
 
+# cost of the soft conflicts of a course with the bitmask of the
+# courses scheduled in its period
+def period_conflicts(instance, courses, course):
+  primary_secondaries = courses & instance.primary_secondary_masks[course]
+  secondaries = courses & instance.secondary_masks[course]
+  # bin().count rather than int.bit_count, which needs Python 3.10
+  return bin(primary_secondaries).count('1') * PRIMARY_SECONDARY_CONFLICT_WEIGHT + \
+    bin(secondaries).count('1') * SECONDARY_SECONDARY_CONFLICT_WEIGHT
+
+def is_first_exam(event):
+  two_part = event.get('TwoPart')
+  part = event.get('ExamType')
+  return (two_part == True and part == "Written") or (two_part == None)
+
 # PRIMARY_PRIMARY_DISTANCE_WEIGHT
 # PRIMARY_SECONDARY_DISTANCE_WEIGHT
-# SECONDARY_SECONDARY_DISTANCE_WEIGHT
 def distance_constraints(solution):
-  cost = 0
-
-  visited = defaultdict(dict)
-  visited_distances = defaultdict(dict)
-
-  def is_first_exam(event):
-    two_part = event.get('TwoPart')
-    part = event.get('ExamType')
-    return (two_part == True and part == "Written") or (two_part == None)
-
-  for assignment in solution.assignments:
-    for event in assignment.events:
-      period = event.period
-      course = event.course_metadata
-      two_part_og = course.get('TwoPart')
-      course_name = course['Course']
-      min_pp_distance = course.get('PrimaryPrimaryDistance') or 2 * course['SlotsPerDay']
-      primary_courses = course["PrimaryCourses"]
-      visited[course_name] = True
-
-      for pp_course in primary_courses:
-        if (visited.get(pp_course, False) == True): continue
-        course_id = solution.course_assignment_ids[pp_course]
-        check_assignment = solution.assignments[course_id]
-        for check_event in check_assignment.events:
-          event_course = check_event.course_metadata
-          is_allowed = is_first_exam(course) and is_first_exam(event_course)
-          if is_allowed and abs(check_event.period - event.period) < min_pp_distance:
-            visited_distances[f"{pp_course}:{course_name}"] = True
-            cost += (PRIMARY_PRIMARY_DISTANCE_WEIGHT * (min_pp_distance - abs(check_event.period - event.period)))
-
-      min_ps_distance = course.get('PrimarySecondaryDistance') or course['SlotsPerDay']
-      primary_secondary_courses = course["PrimarySecondaryCourses"]
-
-      for ps_course in (primary_secondary_courses):
-        if (visited_distances.get(f"{ps_course}:{course_name}", False) == True): continue
-        if (visited.get(ps_course, False) == True): continue
-        course_id = solution.course_assignment_ids[ps_course]
-        check_assignment = solution.assignments[course_id]
-        for check_event in check_assignment.events:
-          event_course = check_event.course_metadata
-          is_allowed = is_first_exam(course) and is_first_exam(event_course)
-          if is_allowed and abs(check_event.period - event.period) < min_ps_distance:
-            cost += (PRIMARY_SECONDARY_DISTANCE_WEIGHT * (min_ps_distance - abs(check_event.period - event.period)))
-
-      # min_ss_distance = course['SlotsPerDay']
-      # secondary_courses = course["SecondaryCourses"]
-
-      # for secondary_course in secondary_courses:
-      #   course_id = solution.course_assignment_ids[secondary_course]
-      #   check_assignment = solution.assignments[course_id]
-      #   for check_event in check_assignment.events:
-      #     if abs(event.period - check_event.period) < min_ss_distance:
-      #       cost += SECONDARY_SECONDARY_DISTANCE_WEIGHT * abs(event.period - check_event.period)
+  return pairs_distance(solution.instance.distance_pairs, solution.event_periods)
 
+# pairs are the (event, event, min distance, weight) of the compiled
+# instance, periods maps the event ids to their periods
+def pairs_distance(pairs, periods):
+  cost = 0
+  for first, second, min_distance, weight in pairs:
+    if periods[first] == NO_PERIOD or periods[second] == NO_PERIOD: continue
+    distance = abs(periods[first] - periods[second])
+    if distance < min_distance:
+      cost += weight * (min_distance - distance)
   return cost
 
 def evaluate(solution):
-  assignments = solution.assignments
-  constraints = solution.constraints
-  undesired_constraints = list(filter(lambda val: val['Level'] == 'Undesired', constraints))
-  preferred_constraints = list(filter(lambda val: val['Level'] == 'Preferred', constraints))
-
   cost = 0
-  cost += room_and_period_costs(assignments, undesired_constraints, preferred_constraints)
-  cost += written_oral_distance(assignments)
-  cost += same_course_distance(assignments)
+  cost += room_and_period_costs(solution)
+  cost += written_oral_distance(solution)
+  cost += same_course_distance(solution)
   cost += primary_secondary_conflict(solution)
   cost += distance_constraints(solution)
 
   return cost
+
+"""
+Incremental evaluation -
+Keeps the cost of a solution up to date while events are added,
+removed or moved, so a mutation only pays for the events it touches.
+Per-event costs are updated eagerly, course and course pair distances
+are recomputed lazily for the courses touched since the last read.
+"""
+class IncrementalEvaluator:
+  # periods and rooms are the event arrays of the solution, read in place
+  def __init__(self, instance, periods, rooms):
+    self.instance = instance
+    self.periods = periods
+    self.rooms = rooms
+    self.scheduled_courses = [0] * instance.periods
+    self.course_costs = [0] * len(instance.course_names)
+    self.pair_costs = {}
+    self.dirty_courses = set()
+    self.preference_cost = 0
+    self.conflict_cost = 0
+    self.distance_cost = 0
+
+  @property
+  def cost(self):
+    self.flush()
+    return self.preference_cost + self.conflict_cost + self.distance_cost
+
+  # called once the event has its period and room
+  def add_event(self, event):
+    period, course = self.periods[event], self.instance.event_courses[event]
+    self.preference_cost += event_preference_cost(self.instance, event, period, self.rooms[event])
+    self.enter(period, course)
+    self.dirty_courses.add(course)
+
+  # called while the event still has its period and room
+  def remove_event(self, event):
+    period, course = self.periods[event], self.instance.event_courses[event]
+    self.preference_cost -= event_preference_cost(self.instance, event, period, self.rooms[event])
+    self.leave(period, course)
+    self.dirty_courses.add(course)
+
+  def copy(self, periods, rooms):
+    evaluator = copy.copy(self)
+    evaluator.periods = periods
+    evaluator.rooms = rooms
+    evaluator.scheduled_courses = self.scheduled_courses.copy()
+    evaluator.course_costs = self.course_costs.copy()
+    evaluator.pair_costs = self.pair_costs.copy()
+    evaluator.dirty_courses = self.dirty_courses.copy()
+    return evaluator
+
+  def move_room(self, event, room):
+    period = self.periods[event]
+    self.preference_cost -= event_preference_cost(self.instance, event, period, self.rooms[event])
+    self.rooms[event] = room
+    self.preference_cost += event_preference_cost(self.instance, event, period, room)
+
+  """
+  Soft conflicts -
+  A bitmask of the courses scheduled in every period, a course having at
+  most one event per period (its parts and exams are placed in increasing
+  periods). A course entering or leaving a period adds or removes its
+  primary/secondary and secondary conflicts with the others
+  """
+  def enter(self, period, course):
+    self.conflict_cost += period_conflicts(self.instance, self.scheduled_courses[period], course)
+    self.scheduled_courses[period] |= 1 << course
+
+  def leave(self, period, course):
+    self.scheduled_courses[period] &= ~(1 << course)
+    self.conflict_cost -= period_conflicts(self.instance, self.scheduled_courses[period], course)
+
+  def flush(self):
+    if len(self.dirty_courses) == 0: return
+    visited_pairs = set()
+
+    for course in self.dirty_courses:
+      events = placed_events(self.instance, self.periods, course)
+      new_cost = 0
+      if events:
+        new_cost = course_written_oral_distance(self.instance, events, self.periods) + \
+          course_same_course_distance(self.instance, events, self.periods)
+      self.distance_cost += new_cost - self.course_costs[course]
+      self.course_costs[course] = new_cost
+
+      for other in self.instance.course_distances[course]:
+        pair = (course, other) if course < other else (other, course)
+        if pair in visited_pairs: continue
+        visited_pairs.add(pair)
+        self.update_pair(pair)
+
+    self.dirty_courses = set()
+
+  # the costs a course takes part in: its preferences, its soft conflicts
+  # and its distances, the pair distances counted for both courses
+  def course_cost(self, course):
+    self.flush()
+    cost = self.course_costs[course]
+    for other in self.instance.course_distances[course]:
+      cost += self.pair_costs.get((course, other) if course < other else (other, course), 0)
+    for event in placed_events(self.instance, self.periods, course):
+      period = self.periods[event]
+      cost += event_preference_cost(self.instance, event, period, self.rooms[event])
+      cost += period_conflicts(self.instance, self.scheduled_courses[period] & ~(1 << course), course)
+    return cost
+
+  def update_pair(self, pair):
+    old_cost = self.pair_costs.pop(pair, 0)
+    new_cost = 0
+    pairs = self.instance.course_distance_pairs.get(pair)
+    if pairs:
+      new_cost = pairs_distance(pairs, self.periods)
+      if new_cost != 0: self.pair_costs[pair] = new_cost
+    self.distance_cost += new_cost - old_cost
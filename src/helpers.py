@@ -4,8 +4,10 @@ import os
 import sys
 import string
 import random
+import argparse
 from pathlib import Path
 import logging
+from loader import read_instance
 
 # import imp
 # try:
@@ -61,7 +63,11 @@ This method contains the main instance parsing logic
 """
 def parse(filepath = None):
     filepath = filepath or get_filepath()
-    data = read_file(filepath)
+    try:
+        data = read_instance(filepath)
+    except:
+        print("Cannot open file! Might not exist.")
+        return None
     if not data: return None
 
     return data
@@ -108,9 +114,54 @@ def grouped_shuffle(courses):
 
     return shuffled_courses
 
+SEARCHES = ['ils', 'sa', 'hillclimbing', 'greedy', 'tabu', 'descent', 'lahc', 'alns']
+
 def solve_all_arg():
     return len(sys.argv) > 1 and sys.argv[1] == 'all'
 
+def solver_options():
+    parser = argparse.ArgumentParser(prog='src', description='Solve one instance')
+    parser.add_argument('instance', nargs='?', default='instances/D1-1-16.json')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes for the constructions')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds of search')
+    parser.add_argument('--evaluations', type=int, default=None, help='evaluated moves of search')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--algorithm', choices=SEARCHES, default='ils', help='search run after the construction')
+    parser.add_argument('--islands', type=int, default=None, help='worker processes running independent searches')
+    parser.add_argument('--island-algorithms', choices=SEARCHES, nargs='+', default=None, help='searches dealt to the islands, --algorithm by default')
+    parser.add_argument('--migration-interval', type=float, default=10, help='seconds between the migrations of the islands')
+    parser.add_argument('--replicas', type=int, default=None, help='worker processes running parallel tempering')
+    parser.add_argument('--exchange-interval', type=float, default=1, help='seconds between the replica exchanges')
+    parser.add_argument('--instrument', action='store_true', help='count and time the solver operations')
+    parser.add_argument('--profile', default=None, help='write a cProfile pstats file')
+    parser.add_argument('--log', default=None, help='write the search progress as JSON lines to this file')
+    return parser.parse_args()
+
+def benchmark_arg():
+    return len(sys.argv) > 1 and sys.argv[1] == 'bench'
+
+def benchmark_options():
+    parser = argparse.ArgumentParser(prog='src bench', description='Benchmark a search against the best known costs')
+    parser.add_argument('bench')
+    parser.add_argument('instances', nargs='*', help='instance files, all of instances/ by default')
+    parser.add_argument('--algorithm', choices=SEARCHES, default='ils')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--time-limit', type=float, default=60, help='seconds of search per run, 0 for none')
+    parser.add_argument('--evaluations', type=int, default=None, help='evaluated moves per run')
+    parser.add_argument('--output', default=None, help='report file, benchmarks/<algorithm>-<commit>-<date>.json by default')
+    parser.add_argument('--quiet', action='store_true', help='hide the search output')
+    return parser.parse_args()
+
+def batch_options():
+    parser = argparse.ArgumentParser(prog='src all', description='Solve all instances of a folder in parallel')
+    parser.add_argument('all')
+    parser.add_argument('folder', nargs='?', default='instances')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds of search per instance')
+    parser.add_argument('--evaluations', type=int, default=None, help='evaluated moves of search per instance')
+    parser.add_argument('--seed', type=int, default=None, help='base seed, instance i runs with seed + i')
+    return parser.parse_args()
+
 def log(filename = None, disabled = True):
     if (filename is not None):
         logging.basicConfig(
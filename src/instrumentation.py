@@ -0,0 +1,114 @@
+import time
+import cProfile
+import functools
+import contextlib
+from collections import Counter, defaultdict
+from helpers import tprint
+
+"""
+Instrumentation -
+Opt-in counters and timers of the solver hot paths. While installed, the
+timed functions are replaced by wrappers counting their calls, time and
+outcomes, and the inline counters of the solver, guarded by a check of
+`instrumentation.active`, are recorded. Otherwise the solver runs its plain
+functions. Times are inclusive, a construction also counts the room and
+period probes it makes. Only this process is measured, not the workers
+"""
+active = None
+
+# the caller checks that instrumentation is active
+def count(name, amount = 1):
+    active.counts[name] += amount
+
+def outcome(result):
+    return 'failed' if result == None else 'succeeded'
+
+class Instruments:
+    def __init__(self):
+        self.calls = Counter()
+        self.times = defaultdict(float)
+        self.counts = Counter()
+        self.patched = []
+
+    def timed(self, owner, name, label = None, outcome = None):
+        label = label or name
+        original = owner.__dict__[name]
+        static = isinstance(original, staticmethod)
+        function = original.__func__ if static else original
+        instruments = self
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                instruments.times[label] += time.perf_counter() - start_time
+                instruments.calls[label] += 1
+            if outcome != None: instruments.counts[f'{label} {outcome(result)}'] += 1
+            return result
+
+        setattr(owner, name, staticmethod(wrapper) if static else wrapper)
+        self.patched.append((owner, name, original))
+
+    def install(self):
+        global active
+        import evaluation
+        from solution import Solution
+        from evaluation import IncrementalEvaluator
+
+        self.timed(Solution, 'solve', 'construction', outcome)
+        self.timed(Solution, 'available_room_period')
+        self.timed(Solution, 'mutate_courses', 'mutate courses', outcome)
+        self.timed(Solution, 'mutate_rooms', 'mutate rooms', outcome)
+        self.timed(Solution, 'try_move', 'move', lambda moved: 'succeeded' if moved else 'failed')
+        self.timed(Solution, 'copy')
+        self.timed(Solution, 'rollback')
+        self.timed(Solution, 'validate')
+        self.timed(IncrementalEvaluator, 'add_event', 'evaluate: add event')
+        self.timed(IncrementalEvaluator, 'remove_event', 'evaluate: remove event')
+        self.timed(IncrementalEvaluator, 'move_room', 'evaluate: move room')
+        self.timed(IncrementalEvaluator, 'flush', 'evaluate: distances')
+        self.timed(evaluation, 'evaluate', 'full evaluate')
+        for component in ['room_and_period_costs', 'written_oral_distance', 'same_course_distance', 'primary_secondary_conflict', 'distance_constraints']:
+            self.timed(evaluation, component, f'full evaluate: {component}')
+        active = self
+
+    def uninstall(self):
+        global active
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = []
+        active = None
+
+    def summary(self):
+        lines = [f"{'Operation':<50} {'Calls':>10} {'Time':>10} {'Per call':>12}"]
+        for label, seconds in sorted(self.times.items(), key=lambda item: item[1], reverse=True):
+            calls = self.calls[label]
+            lines.append(f"{label:<50} {calls:>10} {seconds:>9.3f}s {seconds / calls * 1e6:>10.1f}us")
+        for name, amount in sorted(self.counts.items()):
+            lines.append(f"{name:<50} {amount:>10}")
+        return '\n'.join(lines)
+
+"""
+Instrumented run -
+Instruments the solver and profiles it with cProfile while in this
+context, printing the summary and writing the pstats file at its end
+"""
+@contextlib.contextmanager
+def instrumented(enabled = False, profile_path = None):
+    instruments = Instruments() if enabled else None
+    profiler = cProfile.Profile() if profile_path else None
+    if instruments != None: instruments.install()
+    if profiler != None: profiler.enable()
+    try:
+        yield instruments
+    finally:
+        if profiler != None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            tprint(f"Profile written to {profile_path}.")
+        if instruments != None:
+            instruments.uninstall()
+            tprint("Instrumentation summary:")
+            print(instruments.summary())
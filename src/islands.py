@@ -0,0 +1,119 @@
+import io
+import os
+import time
+import random
+import itertools
+import signal
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from solution import Solution
+from budget import Budget
+import runlog
+
+"""
+Island model -
+Independent searches, one per island, run in worker processes in epochs.
+Between the epochs the islands exchange their elite solutions on a ring:
+every island sends its best solution to the next one, which continues
+from it when it is better than its own. Solutions travel as their
+placements, and the workers receive the compiled instance and the search
+once, when the pool starts
+"""
+worker_instance = None
+worker_instance_path = None
+worker_search = None
+
+def init_worker(instance, instance_path, search):
+    global worker_instance, worker_instance_path, worker_search
+    worker_instance = instance
+    worker_instance_path = instance_path
+    worker_search = search
+    # the parent stops the islands between epochs, see Budget.handle_interrupts
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    runlog.active = None
+    Solution.observer = None
+
+def run_island(algorithm, seed, placements, time_limit, evaluations):
+    random.seed(seed)
+    solution = Solution.rebuild(worker_instance, placements, worker_instance_path) if placements != None else None
+    budget = Budget(time_limit, evaluations)
+    # the search progress of the islands would only interleave
+    with contextlib.redirect_stdout(io.StringIO()):
+        solution = worker_search(algorithm, worker_instance, worker_instance_path, budget, solution=solution)
+    if solution == None: return None, budget.spent
+    return (solution.cost, solution.placements()), budget.spent
+
+# the time and evaluations of every worker for the next epoch, the remaining
+# evaluations being shared by the workers
+def epoch_budget(budget, workers, interval, interval_evaluations):
+    time_limit, evaluations = None, None
+    if budget.deadline != None:
+        time_limit = min(interval, max(0, budget.deadline - time.time()))
+    if budget.evaluations != None:
+        evaluations = min(interval_evaluations, max(0, budget.evaluations - budget.spent) // workers or 1)
+    if not budget.bounded():
+        time_limit = interval
+    return time_limit, evaluations
+
+class Islands:
+    def __init__(self, instance, instance_path, search, algorithms, islands = None, migration_interval = 10, migration_evaluations = 10000, epochs = 10):
+        self.instance = instance
+        self.instance_path = instance_path
+        self.islands = islands or os.cpu_count()
+        # the algorithms are dealt to the islands in turn
+        self.algorithms = [algorithms[i % len(algorithms)] for i in range(self.islands)]
+        self.migration_interval = migration_interval
+        self.migration_evaluations = migration_evaluations
+        self.epochs = epochs
+        self.pool = ProcessPoolExecutor(max_workers=self.islands, initializer=init_worker, initargs=(instance, instance_path, search))
+
+    # every island takes the best solution of the previous one when it is better
+    def migrate(self, states):
+        incoming = states[-1:] + states[:-1]
+        return [
+            migrant if state == None or (migrant != None and migrant[0] < state[0]) else state
+            for state, migrant in zip(states, incoming)
+        ]
+
+    # the islands start from the given solution, or from their own constructions
+    def solve(self, budget = None, solution = None):
+        budget = budget or Budget()
+        states = [None] * self.islands
+        best = None
+        if solution != None:
+            best = (solution.cost, solution.placements())
+            states = [best] * self.islands
+
+        for epoch in itertools.count() if budget.bounded() else range(self.epochs):
+            if budget.expired(): break
+            time_limit, evaluations = epoch_budget(budget, self.islands, self.migration_interval, self.migration_evaluations)
+            futures = [
+                self.pool.submit(run_island, algorithm, random.randrange(2**31), state and state[1], time_limit, evaluations)
+                for algorithm, state in zip(self.algorithms, states)
+            ]
+            results = [future.result() for future in futures]
+            budget.spend(sum(spent for _, spent in results))
+            states = [state if state != None else previous for (state, _), previous in zip(results, states)]
+
+            found = [state for state in states if state != None]
+            if len(found) == 0: continue
+            epoch_best = min(found, key=lambda state: state[0])
+            if best == None or epoch_best[0] < best[0]:
+                best = epoch_best
+                if Solution.observer != None:
+                    Solution.observer.accepted(Solution.rebuild(self.instance, best[1], instance_path=self.instance_path))
+            costs = [state and state[0] for state in states]
+            runlog.report('migration', f"Epoch {epoch}: best cost {best[0]}, islands {costs}", Epoch=epoch, BestCost=best[0], Costs=costs)
+            states = self.migrate(states)
+
+        if best == None: return None
+        return Solution.rebuild(self.instance, best[1], instance_path=self.instance_path)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
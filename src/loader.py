@@ -0,0 +1,136 @@
+import re
+import sys
+import json
+
+"""
+Streaming instance loader -
+Reads an instance file in chunks and decodes the large lists of the
+instance (Constraints, Courses, Rooms and Curricula) one object at a time,
+so that the whole file is never held as one string. Constraints, the most
+numerous objects, become compact slotted records with interned values;
+the other objects stay dictionaries, since the preprocessing copies and
+extends them
+"""
+CHUNK_SIZE = 1 << 16
+STREAMED_LISTS = ('Constraints', 'Courses', 'Rooms', 'Curricula')
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+def interned(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class Constraint:
+    __slots__ = ('Type', 'Level', 'Course', 'Exam', 'Part', 'Period', 'Room')
+
+    def __init__(self, data):
+        get = data.get
+        self.Type = interned(get('Type'))
+        self.Level = interned(get('Level'))
+        self.Course = interned(get('Course'))
+        self.Exam = get('Exam')
+        self.Part = interned(get('Part'))
+        self.Period = get('Period')
+        self.Room = interned(get('Room'))
+
+    # constraints are read like the dictionaries of the instance file,
+    # absent fields being missing keys
+    def get(self, field, default = None):
+        value = getattr(self, field, None)
+        return default if value == None else value
+
+    def __getitem__(self, field):
+        value = getattr(self, field, None)
+        if value == None: raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        return getattr(self, field, None) != None
+
+    def to_dict(self):
+        return { field: getattr(self, field) for field in self.__slots__ if getattr(self, field) != None }
+
+    def __repr__(self):
+        return f'Constraint({self.to_dict()})'
+
+RECORDS = { 'Constraints': Constraint }
+
+class JsonStream:
+    def __init__(self, file):
+        self.file = file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self, size = CHUNK_SIZE):
+        if self.position > 0:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        chunk = self.file.read(max(size, len(self.buffer)))
+        if chunk == '': self.eof = True
+        self.buffer += chunk
+
+    def peek(self):
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer): return self.buffer[self.position]
+            if self.eof: raise ValueError('Unexpected end of the instance file')
+            self.fill()
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError(f'Expected {character!r} at {self.buffer[self.position:self.position + 20]!r}')
+        self.position += 1
+
+    # a value is complete once it parses and is followed by more input,
+    # otherwise it may be cut by the end of the chunk (like a number)
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self.fill()
+
+    def items(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.position += 1
+                continue
+            self.expect(']')
+            return
+
+    def members(self):
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.position += 1
+                continue
+            self.expect('}')
+            return
+
+def read_instance(filepath):
+    data = {}
+    with open(filepath) as file:
+        stream = JsonStream(file)
+        for key in stream.members():
+            if key in STREAMED_LISTS and stream.peek() == '[':
+                record = RECORDS.get(key)
+                data[key] = [record(item) if record else item for item in stream.items()]
+            else:
+                data[key] = stream.value()
+    return data
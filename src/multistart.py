@@ -0,0 +1,81 @@
+import os
+import io
+import random
+import signal
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from solution import Solution
+import runlog
+
+"""
+Multi-start construction -
+Randomized constructions of an instance run concurrently on a process pool.
+The workers receive the compiled instance once, when the pool starts, and
+send back only the placements of a feasible construction, which are
+replayed into a Solution here. The pool is kept between calls so that
+restarts of a search do not pay for it again
+"""
+worker_instance = None
+
+def init_worker(instance):
+    global worker_instance
+    worker_instance = instance
+    # the parent stops the pool on Ctrl+C, see MultiStart.close
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # a forked worker does not write to the run log of its parent
+    runlog.active = None
+
+def construct(seed):
+    random.seed(seed)
+    solution = Solution(worker_instance)
+    # the retry progress of the workers would only interleave
+    with contextlib.redirect_stdout(io.StringIO()):
+        found = solution.solve()
+    if found == None: return None
+    return solution.cost, solution.last_period, solution.placements()
+
+class MultiStart:
+    def __init__(self, instance, workers = None):
+        self.instance = instance
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(instance,))
+
+    """
+    Construct -
+    Runs constructions in rounds of one per worker and returns the best of
+    the first `best_of` feasible ones, taken in submission order so that a
+    seeded run gives the same solution whatever the timing of the workers
+    """
+    def solve(self, instance_path = None, best_of = 1, attempts = 700):
+        found = []
+        attempt = 0
+
+        while len(found) < best_of and attempt < attempts:
+            batch = min(self.workers, attempts - attempt)
+            futures = [self.pool.submit(construct, random.randrange(2**31)) for _ in range(batch)]
+            for future in futures:
+                if len(found) == best_of:
+                    future.cancel()
+                    continue
+                result = future.result()
+                attempt += 1
+                if result != None: found.append((result, attempt - 1))
+
+        if len(found) == 0:
+            print("Could not solve in time!")
+            return None
+
+        (cost, last_period, placements), attempt = min(found, key=lambda x: x[0][0])
+        solution = Solution.rebuild(self.instance, placements, instance_path=instance_path)
+        solution.last_period = last_period
+        solution.attempt = attempt
+        return solution
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
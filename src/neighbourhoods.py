@@ -0,0 +1,222 @@
+import random
+from bisect import bisect_left, bisect_right
+from enums import NO_ROOM
+
+"""
+Neighbourhoods -
+Fine-grained moves of the local searches, which keep the solution
+feasible: an event to another period (in its cheapest free room), the
+periods of two events swapped, the rooms of two events of the same period
+swapped, a Kempe chain of two periods exchanged, and the whole contents of
+two periods exchanged. A move is a tuple of its kind and arguments, applied
+within a journal; the incremental evaluator then only updates the costs of
+the moved events and their courses, so its cost is read in the order of
+the conflict and distance degrees of the moved courses
+"""
+def period_move(solution, event, period):
+    solution.release_event(event)
+    room = solution.cheapest_room(event, period)
+    if room == None: return False
+    solution.place_event(event, period, room)
+    return True
+
+def swap_periods(solution, one, two):
+    one_period, two_period = solution.event_periods[one], solution.event_periods[two]
+    solution.release_event(one)
+    solution.release_event(two)
+    one_room = solution.cheapest_room(one, two_period)
+    if one_room == None: return False
+    solution.place_event(one, two_period, one_room)
+    two_room = solution.cheapest_room(two, one_period)
+    if two_room == None: return False
+    solution.place_event(two, one_period, two_room)
+    return True
+
+# the rooms of the period stay occupied, only their events change
+def swap_rooms(solution, one, two):
+    one_room, two_room = solution.event_rooms[one], solution.event_rooms[two]
+    solution.move_room(one, two_room)
+    solution.move_room(two, one_room)
+    return True
+
+# the events of each period go to the other one, in their own room while
+# it is free there and otherwise in their cheapest free room
+def exchange_periods(solution, events, one, two):
+    rooms = [solution.event_rooms[event] for event in events]
+    targets = [two if solution.event_periods[event] == one else one for event in events]
+    for event in events: solution.release_event(event)
+    for event, room, period in zip(events, rooms, targets):
+        if room == NO_ROOM or solution.room_taken(period, room):
+            room = solution.cheapest_room(event, period)
+            if room == None: return False
+        solution.place_event(event, period, room)
+    return True
+
+MOVES = {
+    'period': period_move,
+    'swap': swap_periods,
+    'rooms': swap_rooms,
+    'kempe': exchange_periods,
+    'periods': exchange_periods,
+}
+
+def apply_move(solution, move):
+    return MOVES[move[0]](solution, *move[1:])
+
+# the cost of the solution after the move, None when it is not feasible
+def move_cost(solution, move):
+    solution.begin()
+    cost = solution.evaluator.cost if apply_move(solution, move) else None
+    solution.rollback()
+    return cost
+
+# (event, period) before and after the move of every moved event
+def move_attributes(solution, move):
+    kind = move[0]
+    if kind == 'kempe' or kind == 'periods':
+        _, events, one, two = move
+        sources = [(event, solution.event_periods[event]) for event in events]
+        return sources, [(event, two if period == one else one) for event, period in sources]
+    one = move[1]
+    if kind == 'period':
+        return [(one, solution.event_periods[one])], [(one, move[2])]
+    two = move[2]
+    one_period, two_period = solution.event_periods[one], solution.event_periods[two]
+    if kind == 'swap':
+        return [(one, one_period), (two, two_period)], [(one, two_period), (two, one_period)]
+    return [(one, one_period), (two, two_period)], [(one, one_period), (two, two_period)]
+
+"""
+Kempe chains -
+The events of two periods linked by hard conflicts (and by their course),
+starting from one event. Exchanging the periods of a whole chain never
+creates a hard conflict, since every event conflicting with a moved event
+in the other period moves along with it
+"""
+def kempe_chain(solution, by_period, event, period):
+    instance = solution.instance
+    source = solution.event_periods[event]
+    chain = [event]
+    chained = {event}
+    pending = [(event, period)]
+    while len(pending) > 0:
+        moving, target = pending.pop()
+        course = instance.event_courses[moving]
+        conflicts = instance.conflict_masks[course] | 1 << course
+        for other in by_period[target]:
+            if other in chained or not conflicts >> instance.event_courses[other] & 1: continue
+            chained.add(other)
+            chain.append(other)
+            pending.append((other, source if target == period else period))
+    return chain
+
+"""
+Sampling -
+Random feasible moves, drawn from the shares of their kinds. The hard
+constraints are checked here, before the move is scored, only the rooms
+are found when it is applied. The events of every period are indexed, and
+the index is rebuilt after every applied move
+"""
+class Neighbourhood:
+    def __init__(self, solution, kinds = None):
+        instance = solution.instance
+        self.solution = solution
+        self.kinds = kinds or { 'period': 0.4, 'swap': 0.2, 'rooms': 0.1, 'kempe': 0.2, 'periods': 0.1 }
+        self.domains = [course['PossiblePeriods'] for course in instance.events]
+        self.period_sets = [set(periods) for periods in self.domains]
+        self.room_sets = [set(course['Rooms']) for course in instance.events]
+        self.candidates = {
+            'period': self.period_candidate,
+            'swap': self.swap_candidate,
+            'rooms': self.rooms_candidate,
+            'kempe': self.kempe_candidate,
+            'periods': self.periods_candidate,
+        }
+        self.by_period = None
+
+    def index(self):
+        self.by_period = [[] for _ in range(self.solution.instance.periods)]
+        for event, period in enumerate(self.solution.event_periods):
+            self.by_period[period].append(event)
+
+    # a period of the event's domain within its window, other than its own
+    def random_period(self, event):
+        lower, upper = self.solution.period_window(event)
+        domain = self.domains[event]
+        start, end = bisect_right(domain, lower), bisect_left(domain, upper)
+        if end - start < 2: return None
+        period = domain[random.randrange(start, end)]
+        return None if period == self.solution.event_periods[event] else period
+
+    def can_move(self, event, period):
+        if period not in self.period_sets[event]: return False
+        lower, upper = self.solution.period_window(event)
+        return lower < period < upper
+
+    def period_candidate(self, event):
+        period = self.random_period(event)
+        if period == None or not self.solution.can_host(event, period): return None
+        return ('period', event, period)
+
+    def swap_candidate(self, one):
+        solution = self.solution
+        instance = solution.instance
+        two_period = self.random_period(one)
+        if two_period == None or len(self.by_period[two_period]) == 0: return None
+        two = random.choice(self.by_period[two_period])
+        one_course, two_course = instance.event_courses[one], instance.event_courses[two]
+        if one_course == two_course: return None
+
+        one_period = solution.event_periods[one]
+        if not self.can_move(two, one_period): return None
+        if not solution.can_host(one, two_period, 1 << two_course): return None
+        if not solution.can_host(two, one_period, 1 << one_course): return None
+        return ('swap', one, two)
+
+    def rooms_candidate(self, one):
+        solution = self.solution
+        one_room = solution.event_rooms[one]
+        if one_room == NO_ROOM: return None
+        two = random.choice(self.by_period[solution.event_periods[one]])
+        two_room = solution.event_rooms[two]
+        if two_room == NO_ROOM or two_room == one_room: return None
+        if two_room not in self.room_sets[one] or one_room not in self.room_sets[two]: return None
+        return ('rooms', one, two)
+
+    # every exchanged event keeps the precedences of its course, so a course
+    # may only have one event among them
+    def exchangeable(self, events, one, two):
+        courses = set(self.solution.instance.event_courses[event] for event in events)
+        if len(courses) < len(events): return False
+        for event in events:
+            period = two if self.solution.event_periods[event] == one else one
+            if not self.can_move(event, period): return False
+        return True
+
+    def kempe_candidate(self, event):
+        period = self.random_period(event)
+        if period == None: return None
+        one = self.solution.event_periods[event]
+        chain = kempe_chain(self.solution, self.by_period, event, period)
+        if not self.exchangeable(chain, one, period): return None
+        return ('kempe', tuple(chain), one, period)
+
+    def periods_candidate(self, event):
+        one = self.solution.event_periods[event]
+        two = random.randrange(self.solution.instance.periods)
+        if one == two: return None
+        events = self.by_period[one] + self.by_period[two]
+        if not self.exchangeable(events, one, two): return None
+        return ('periods', tuple(events), one, two)
+
+    def sample(self, size, tries = 4):
+        total_events = len(self.solution.event_periods)
+        kinds = list(self.kinds)
+        weights = list(self.kinds.values())
+        for _ in range(size * tries):
+            kind = random.choices(kinds, weights)[0]
+            move = self.candidates[kind](random.randrange(total_events))
+            if move == None: continue
+            yield move
+            size -= 1
+            if size == 0: return
@@ -1,3 +1,4 @@
+import time
 from helpers import *
 from collections import defaultdict
 
@@ -40,86 +41,121 @@ def flat_map_courses(courses):
 
     return flat_courses
 
+"""
+Indexes -
+The rooms, forbidden event periods, curricula and teachers are grouped by
+what the courses look them up by, in one pass over each of them, so that
+annotating a course costs only its own entries
+"""
+def index_rooms(rooms):
+    room_types = { room['Room']: room['Type'] for room in rooms }
+    index = { 'single': [], 'types': defaultdict(list), 'composites': defaultdict(list) }
+
+    for room in rooms:
+        if room['Type'] != "Composite": index['single'].append(room['Room'])
+        index['types'][room['Type']].append(room['Room'])
+        members = room.get('Members')
+        if members:
+            key = (len(members), room_types.get(members[0]))
+            index['composites'][key].append(room['Room'] + ":" + ",".join(members))
+
+    return index
+
+def index_event_period_constraints(event_period_constraints):
+    index = defaultdict(list)
+    for constraint in event_period_constraints:
+        index[(constraint['Course'], constraint['Exam'])].append(constraint)
+    return index
+
+def index_curricula(curricula):
+    primaries = defaultdict(list)
+    secondaries = defaultdict(list)
+    for curriculum in curricula:
+        for course_name in set(curriculum['PrimaryCourses']):
+            primaries[course_name].append(curriculum)
+        for course_name in set(curriculum['SecondaryCourses']):
+            secondaries[course_name].append(curriculum)
+    return primaries, secondaries
+
+def index_teachers(courses):
+    course_per_teacher = defaultdict(list)
+    for course in courses:
+        course_per_teacher[course['Teacher']].append(course['Course'])
+    return { teacher: list(set(names)) for teacher, names in course_per_teacher.items() }
+
 # constraints are provided all as Undesired (soft)
-def add_possible_rooms(courses, rooms, constraints):
-    _courses = courses.copy()
-    for course in _courses:
-        req_rooms = course['RoomsRequested']
-        room_numbers = req_rooms['Number']
-
-        is_oral = course['ExamType'] == 'Oral'
-        specs = course.get('WrittenOralSpecs')
-        room_for_oral = specs and specs.get('RoomForOral')
-
-        course['PossibleRooms'] = []
-
-        if is_oral and room_for_oral:
-            def fun(room):
-                match = room['Type'] != "Composite"
-                if match: return room['Room']
-                return None
-            course['PossibleRooms'] = list(filter(None, list(map(fun, rooms))))
-        elif is_oral and specs and not room_for_oral:
-            course['PossibleRooms'] = []
-        elif room_numbers == 1:
-            room_type = req_rooms['Type']
-            def fun(room):
-                match = room['Type'] == room_type
-                if match: return room['Room']
-                return None
-            course['PossibleRooms'] = list(filter(None, list(map(fun, rooms))))
-        elif room_numbers > 1:
-            room_type = req_rooms['Type']
-            def fun(room):
-                match = room.get('Members') and len(room['Members']) == room_numbers and \
-                    any(_room['Type'] == room_type and _room['Room'] == room['Members'][0] for _room in rooms)
-                if match: return room['Room'] + ":" + ",".join(room['Members'])
-                return None
-            course['PossibleRooms'] = list(filter(None, list(map(fun, rooms))))
-
-    return _courses
-
-def add_curricula_info(courses, curricula, primary_primary_distance, slots_per_day):
-    _courses = courses.copy()
-    for course in _courses:
+def possible_rooms(course, room_index):
+    req_rooms = course['RoomsRequested']
+    room_numbers = req_rooms['Number']
+
+    is_oral = course['ExamType'] == 'Oral'
+    specs = course.get('WrittenOralSpecs')
+    room_for_oral = specs and specs.get('RoomForOral')
+
+    if is_oral and room_for_oral:
+        return room_index['single']
+    elif is_oral and specs and not room_for_oral:
+        return []
+    elif room_numbers == 1:
+        return room_index['types'].get(req_rooms['Type'], [])
+    elif room_numbers > 1:
+        return room_index['composites'].get((room_numbers, req_rooms['Type']), [])
+    return []
+
+def possible_periods(course, periods, constraint_index):
+    exam_type = course['ExamType']
+    constraints = constraint_index.get((course['Course'], course.get('ExamOrder')), [])
+    forbidden_periods = set(c['Period'] for c in constraints if c.get('Part') == None or c['Part'] == exam_type)
+    return [period for period in periods if period not in forbidden_periods]
+
+def curricula_info(course_name, primaries, secondaries):
+    relevant_primaries = primaries.get(course_name, [])
+    relevant_secondaries = secondaries.get(course_name, [])
+    primary_courses = list(map(lambda val : val['PrimaryCourses'], relevant_primaries))
+    secondary_courses = list(map(lambda val : val['SecondaryCourses'], relevant_secondaries))
+
+    primary_secondary_courses = list(map(lambda val : val['SecondaryCourses'], relevant_primaries))
+    secondary_primary_courses = list(map(lambda val : val['PrimaryCourses'], relevant_secondaries))
+    primary_secondary_courses.extend(secondary_primary_courses)
+
+    primary_courses = list(set(flat_map(lambda x: x, primary_courses)))
+    secondary_courses = list(set(flat_map(lambda x: x, secondary_courses)))
+    primary_secondary_courses = list(set(flat_map(lambda x: x, primary_secondary_courses)))
+
+    if course_name in primary_courses: primary_courses.remove(course_name)
+    if course_name in secondary_courses: secondary_courses.remove(course_name)
+    if course_name in primary_secondary_courses: primary_secondary_courses.remove(course_name)
+
+    return primary_courses, secondary_courses, primary_secondary_courses
+
+"""
+Annotate courses -
+A single pass over the flat courses, adding their possible rooms and
+periods, curricula relations and same teacher courses from the indexes.
+The relations are computed once per course and shared by its exams and
+parts, which only read them
+"""
+def annotate_courses(courses, rooms, periods, event_period_constraints, curricula, primary_primary_distance, slots_per_day):
+    room_index = index_rooms(rooms)
+    constraint_index = index_event_period_constraints(event_period_constraints)
+    primaries, secondaries = index_curricula(curricula)
+    teacher_courses = index_teachers(courses)
+    relations = {}
+
+    for course in courses:
         course_name = course['Course']
-        relevant_primaries = list(filter(lambda val : course_name in val['PrimaryCourses'], curricula))
-        primary_courses = list(map(lambda val : val['PrimaryCourses'], relevant_primaries))
-        relevant_secondaries = list(filter(lambda val : course_name in val['SecondaryCourses'], curricula))
-        secondary_courses = list(map(lambda val : val['SecondaryCourses'], relevant_secondaries))
-
-        primary_secondary_courses = list(map(lambda val : val['SecondaryCourses'], relevant_primaries))
-        secondary_primary_courses = list(map(lambda val : val['PrimaryCourses'], relevant_secondaries))
-        primary_secondary_courses.extend(secondary_primary_courses)
-
-        primary_courses = list(set(flat_map(lambda x: x, primary_courses)))
-        secondary_courses = list(set(flat_map(lambda x: x, secondary_courses)))
-        primary_secondary_courses = list(set(flat_map(lambda x: x, primary_secondary_courses)))
-
-        if course_name in primary_courses: primary_courses.remove(course_name)
-        if course_name in secondary_courses: secondary_courses.remove(course_name)
-        if course_name in primary_secondary_courses: primary_secondary_courses.remove(course_name)
-
-        course['PrimaryCourses'] = primary_courses
-        course['SecondaryCourses'] = secondary_courses
-        course['PrimarySecondaryCourses'] = primary_secondary_courses
+        course['PossibleRooms'] = possible_rooms(course, room_index)
+        course['PossiblePeriods'] = possible_periods(course, periods, constraint_index)
+
+        if course_name not in relations:
+            relations[course_name] = curricula_info(course_name, primaries, secondaries)
+        course['PrimaryCourses'], course['SecondaryCourses'], course['PrimarySecondaryCourses'] = relations[course_name]
         course['PrimaryPrimaryDistance'] = primary_primary_distance
         course['SlotsPerDay'] = slots_per_day
 
-    return _courses
-
-def add_same_teacher_courses(courses):
-    _courses = courses.copy()
-    course_per_teacher = defaultdict(list)  
-
-    for course in _courses:
-        course_per_teacher[course['Teacher']].append(course['Course'])
-
-    for course in _courses:
-        unique_teacher_courses = list(set(course_per_teacher[course['Teacher']]))
-        course['SameTeacherCourses'] = list(filter(lambda x: x != course["Course"], unique_teacher_courses))
+        course['SameTeacherCourses'] = list(filter(lambda x: x != course_name, teacher_courses[course['Teacher']]))
 
-    return _courses
+    return courses
 
 def sieve_periods(periods, period_constraints):
     _periods = periods.copy()
@@ -128,28 +164,6 @@ def sieve_periods(periods, period_constraints):
 
     return _periods
 
-def add_possible_periods(courses, periods, event_period_constraints):
-    _courses = courses.copy()
-    for course in _courses:
-        _periods = periods.copy()
-        course_name = course['Course']
-        exam_type = course['ExamType']
-        exam_order = course.get('ExamOrder')
-        filter_fun = lambda x: \
-            (x.get('Part') == None or x['Part'] == exam_type) and \
-            x['Exam'] == exam_order \
-            and x['Course'] == course_name
-        forbidden_periods = list(filter(filter_fun, event_period_constraints))
-        forbidden_periods = list(map(lambda x: x['Period'], forbidden_periods))
-
-        for f_period in forbidden_periods: 
-            if f_period in _periods: 
-                _periods.remove(f_period)
-
-        course['PossiblePeriods'] = _periods
-
-    return _courses
-
 def order_course_by_constraints(courses):
     _courses = courses.copy()
     ordered_courses = sorted(_courses, key=len, reverse=True)
@@ -172,11 +186,18 @@ def group_by_course(courses):
 
 def group_by_exams_and_parts(courses):
     # matrix = [ExamOrder{i} = [One Part + Written TwoPart, Oral TwoPart]]
-    _courses = courses.copy()
-    grouped_courses = []
-    orders = set(map(lambda x:x['ExamOrder'], _courses))
-    for order in orders:
-        order_courses = list(filter(lambda x: x['ExamOrder'] == order, _courses))
-        grouped_courses.append(order_courses)
-
-    return grouped_courses
\ No newline at end of file
+    order_courses = defaultdict(list)
+    for course in courses:
+        order_courses[course['ExamOrder']].append(course)
+
+    return [order_courses[order] for order in set(order_courses)]
+
+"""
+Stage timing -
+Runs one stage of the preprocessing, recording its duration in timings
+"""
+def timed(timings, stage, function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    timings[stage] = time.perf_counter() - start_time
+    return result
\ No newline at end of file
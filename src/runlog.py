@@ -0,0 +1,150 @@
+import os
+import time
+import json
+import queue
+import threading
+import contextlib
+from pathlib import Path
+
+"""
+Run log -
+The progress of a search as JSON lines, one event per line with its time
+since the start of the run. The search only puts the events on a queue,
+a background thread serializes and writes them in batches and flushes
+the file at most every `flush_interval` seconds, so that logging never
+waits on the disk
+"""
+active = None
+
+class RunLog:
+    def __init__(self, path, flush_interval = 1.0):
+        Path(os.path.dirname(path) or '.').mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.start_time = time.time()
+        self.events = queue.SimpleQueue()
+        self.file = open(path, 'w', encoding='utf-8')
+        self.writer = threading.Thread(target=self.write, name='runlog', daemon=True)
+        self.writer.start()
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def record(self, event, **fields):
+        self.events.put((self.elapsed(), event, fields))
+
+    def write(self):
+        last_flush = time.time()
+        closed = False
+        while not closed:
+            batch = [self.events.get()]
+            while not self.events.empty(): batch.append(self.events.get())
+
+            lines = []
+            for entry in batch:
+                if entry == None:
+                    closed = True
+                    break
+                elapsed, event, fields = entry
+                lines.append(json.dumps({ 'Event': event, 'Elapsed': round(elapsed, 4), **fields }))
+            if lines: self.file.write('\n'.join(lines) + '\n')
+
+            if closed or time.time() - last_flush >= self.flush_interval:
+                self.file.flush()
+                last_flush = time.time()
+        self.file.close()
+
+    def close(self):
+        self.events.put(None)
+        self.writer.join()
+
+"""
+Search log -
+An observer of the solutions (see Solution.observer) writing the
+constructions, every new best solution and, at most every `interval`
+seconds, the progress of the search to a run log
+"""
+class SearchLog:
+    def __init__(self, run_log, interval = 1.0):
+        self.run_log = run_log
+        self.interval = interval
+        self.next_progress = time.time() + interval
+        self.moves = 0
+        self.accepted_moves = 0
+        self.cost = None
+        self.best_cost = None
+
+    def record(self, event, **fields):
+        self.run_log.record(event, **fields)
+
+    def state(self, solution):
+        evaluator = solution.evaluator
+        return {
+            'Iteration': self.moves,
+            'Cost': solution.cost,
+            'BestCost': self.best_cost,
+            'Accepted': self.accepted_moves,
+            'Components': {
+                'Preferences': evaluator.preference_cost,
+                'Conflicts': evaluator.conflict_cost,
+                'Distances': evaluator.distance_cost,
+            },
+        }
+
+    def constructed(self, solution):
+        self.cost = solution.cost
+        if self.best_cost == None or solution.cost < self.best_cost: self.best_cost = solution.cost
+        self.record('constructed', **self.state(solution))
+
+    def moved(self, solution):
+        self.moves += 1
+        if time.time() >= self.next_progress:
+            self.next_progress = time.time() + self.interval
+            self.record('progress', **self.state(solution))
+
+    def accepted(self, solution):
+        self.accepted_moves += 1
+        self.cost = solution.cost
+        if self.best_cost == None or solution.cost < self.best_cost:
+            self.best_cost = solution.cost
+            self.record('improved', **self.state(solution))
+
+    def finished(self):
+        self.record('finished', Iteration=self.moves, Cost=self.cost, BestCost=self.best_cost, Accepted=self.accepted_moves)
+
+"""
+Progress -
+Search progress goes to the active run log, or is printed when there is
+none
+"""
+def report(event, text, end = '\n', **fields):
+    if active != None: active.record(event, **fields)
+    else: print(text, end=end)
+
+def validated(solution):
+    results = solution.validation_results
+    report('validated', f"{solution.cost} {results['cost']} {results['valid']}",
+        Cost=solution.cost, ValidatorCost=results['cost'], Valid=results['valid'])
+
+"""
+Logged run -
+Within this context the solutions report to a search log written to
+`path`, nothing is logged without a path
+"""
+@contextlib.contextmanager
+def search_log(path = None, interval = 1.0):
+    global active
+    if path == None:
+        yield None
+        return
+
+    from solution import Solution
+    active = SearchLog(RunLog(path), interval)
+    previous, Solution.observer = Solution.observer, active
+    try:
+        yield active
+    finally:
+        Solution.observer = previous
+        active.finished()
+        active.run_log.close()
+        active = None
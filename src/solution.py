@@ -1,50 +1,208 @@
 import random
 import time
-import json
-from helpers import flat_map, flatten
-from validation import validate_solution
+from validation import validation_session
 from collections import defaultdict
 import copy
-from evaluation import evaluate
+from array import array
+from evaluation import placed_events, IncrementalEvaluator
+from enums import NO_PERIOD, NO_ROOM
+import instrumentation
+import runlog
 
 class Solution:
-    def __init__(self, instances, hard_constraints, with_validation = False, instance_path = None, constraints = None):
+    # notified of constructions, moves and accepted states, see benchmark.Recorder
+    observer = None
 
-        self.instances = instances
+    def __init__(self, instance, with_validation = False, instance_path = None):
+
+        self.instance = instance
+        self.instances = instance.courses
         self.cost = 0
-        self.assignments = []
-        self.course_assignment_ids = {}
-        self.last_assignment_id = 0
-        self.taken_period_room = defaultdict(dict)
-        self.hard_constraints = hard_constraints
-        self.constraints = constraints
-        self.room_period_constraints = list(
-            filter(lambda val: val['Type'] == 'RoomPeriodConstraint', self.hard_constraints)
-        )
+        # the period and room of every event by id, and the courses in the
+        # order they were placed; the event metadata is the instance's
+        self.event_periods = array('i', [NO_PERIOD]) * len(instance.events)
+        self.event_rooms = array('i', [NO_ROOM]) * len(instance.events)
+        self.courses = []
+        # occupancy index: per period a bitmask of the occupied rooms, the
+        # scheduled courses are kept by the evaluator
+        self.occupied_rooms = [0] * instance.periods
+        self.hard_constraints = instance.hard_constraints
+        self.constraints = instance.constraints
         self.validation_results = {}
         self.with_validation = with_validation
         self.last_period = None
         self.instance_path = instance_path
-        self.import_constraints()
+        self.evaluator = IncrementalEvaluator(instance, self.event_periods, self.event_rooms)
+        self.total_events = len(instance.events)
+        self.journals = []
         self.attempt = 0
         self.ancestors = 0
 
-    def import_constraints(self):
-        for c in self.room_period_constraints:
-            room, period = c['Room'], c['Period']
-            self.taken_period_room[period][room] = 'Constraint'
+    # instances are never modified, the construction works on shallow copies
+    # with their own domains, as the constraint propagation rewrites them
+    @staticmethod
+    def fresh_course(course):
+        _course = course.copy()
+        _course['Rooms'] = course['Rooms'].copy()
+        _course['PossiblePeriods'] = course['PossiblePeriods'].copy()
+        return _course
+
+    def record(self, *entry):
+        if len(self.journals) > 0:
+            self.journals[-1][1].append(entry)
+
+    def occupy(self, period, rooms):
+        self.record('occupied', period, self.occupied_rooms[period])
+        self.occupied_rooms[period] = rooms
+
+    def course_events(self, course):
+        return placed_events(self.instance, self.event_periods, course)
+
+    def add_event(self, event, period, room):
+        course = self.instance.event_courses[event]
+        if len(self.course_events(course)) == 0:
+            self.courses.append(course)
+            self.record('created')
+        self.event_periods[event] = period
+        self.event_rooms[event] = NO_ROOM if room == None else room
+        self.evaluator.add_event(event)
+        self.record('added', event)
+
+    def remove_event(self, event):
+        self.evaluator.remove_event(event)
+        self.event_periods[event] = NO_PERIOD
+        self.event_rooms[event] = NO_ROOM
+
+    def move_room(self, event, room):
+        self.record('room', event, self.event_rooms[event])
+        self.evaluator.move_room(event, room)
+
+    def remove_course(self, course):
+        index = self.courses.index(course)
+        self.record('course', index, course)
+        self.courses.pop(index)
+        for event in self.course_events(course):
+            self.record('removed', event, self.event_periods[event], self.event_rooms[event])
+            self.remove_event(event)
+
+    """
+    Journal -
+    Moves are applied in place; begin() opens a journal of every change,
+    rollback() undoes them in reverse order and commit() keeps them,
+    handing them over to the enclosing journal when moves are nested
+    """
+    def begin(self):
+        state = (self.cost, self.attempt, self.ancestors, self.last_period)
+        self.journals.append((state, []))
+
+    def commit(self):
+        _, entries = self.journals.pop()
+        if len(self.journals) > 0:
+            self.journals[-1][1].extend(entries)
+        elif Solution.observer != None:
+            Solution.observer.accepted(self)
+
+    def rollback(self):
+        state, entries = self.journals.pop()
+        for entry in reversed(entries):
+            self.undo(entry)
+        self.cost, self.attempt, self.ancestors, self.last_period = state
+
+    def undo(self, entry):
+        kind = entry[0]
+        if kind == 'occupied':
+            _, period, rooms = entry
+            self.occupied_rooms[period] = rooms
+        elif kind == 'room':
+            _, event, room = entry
+            self.evaluator.move_room(event, room)
+        elif kind == 'course':
+            _, index, course = entry
+            self.courses.insert(index, course)
+        elif kind == 'removed':
+            _, event, period, room = entry
+            self.event_periods[event] = period
+            self.event_rooms[event] = room
+            self.evaluator.add_event(event)
+        elif kind == 'added':
+            _, event = entry
+            self.remove_event(event)
+        elif kind == 'created':
+            self.courses.pop()
+
+    # the event arrays are copied as a whole, the metadata is shared
+    def copy(self):
+        solution = copy.copy(self)
+        solution.event_periods = self.event_periods[:]
+        solution.event_rooms = self.event_rooms[:]
+        solution.courses = self.courses.copy()
+        solution.occupied_rooms = self.occupied_rooms.copy()
+        solution.evaluator = self.evaluator.copy(solution.event_periods, solution.event_rooms)
+        solution.validation_results = self.validation_results.copy()
+        solution.journals = []
+        return solution
+
+    def take_room(self, period, room):
+        self.occupy(period, self.occupied_rooms[period] | self.instance.room_masks[room])
+
+    def release_room(self, period, room):
+        self.occupy(period, self.occupied_rooms[period] & ~self.instance.room_masks[room])
+
+    def room_taken(self, period, room):
+        return (self.occupied_rooms[period] & self.instance.room_masks[room]
+            or self.instance.forbidden_masks[period] >> room & 1)
+
+    def has_conflict(self, period, course):
+        return self.evaluator.scheduled_courses[period] & self.instance.conflict_masks[course['CourseId']] != 0
+
+    """
+    Event moves -
+    Single event moves of the neighbourhood searches, journaled like the
+    mutations. The events of a course have strictly increasing periods in
+    their compiled order (the exam and part precedences), so an event only
+    moves between the periods of its neighbouring events
+    """
+    def period_window(self, event):
+        events = self.instance.course_events[self.instance.event_courses[event]]
+        index = events.index(event)
+        lower = self.event_periods[events[index - 1]] if index > 0 else NO_PERIOD
+        upper = self.event_periods[events[index + 1]] if index + 1 < len(events) else NO_PERIOD
+        return lower, self.instance.periods if upper == NO_PERIOD else upper
+
+    # `leaving` is a bitmask of the courses leaving the period with the move
+    def can_host(self, event, period, leaving = 0):
+        course = self.instance.event_courses[event]
+        scheduled = self.evaluator.scheduled_courses[period] & ~(leaving | 1 << course)
+        return scheduled & self.instance.conflict_masks[course] == 0
+
+    # NO_ROOM for an event without rooms, None when all of its rooms are taken
+    def cheapest_room(self, event, period):
+        rooms = self.instance.events[event]['Rooms']
+        if len(rooms) == 0: return NO_ROOM
+        costs = self.instance.event_room_costs[event]
+        room = None
+        for r in rooms:
+            if self.room_taken(period, r): continue
+            if room == None or costs[r] < costs[room]: room = r
+        return room
+
+    # unlike remove_course, the course of the event stays placed
+    def release_event(self, event):
+        if self.event_rooms[event] != NO_ROOM: self.release_room(self.event_periods[event], self.event_rooms[event])
+        self.record('removed', event, self.event_periods[event], self.event_rooms[event])
+        self.remove_event(event)
+
+    def place_event(self, event, period, room):
+        if room != NO_ROOM: self.take_room(period, room)
+        self.event_periods[event] = period
+        self.event_rooms[event] = room
+        self.evaluator.add_event(event)
+        self.record('added', event)
 
     def available_room_period(self, rooms, periods, course):
-        rooms = rooms.copy()
-        periods = periods.copy()
         room = None
         period = None
 
-        def pairs(one, two):
-            for p in one:
-                for r in two:
-                    yield p, r
-
         # two_part = course.get('TwoPart')
         # min_distance_of_exams = two_part and course.get('MinimumDistanceBetweenExams')
         # specs = course.get('WrittenOralSpecs')
@@ -57,66 +215,36 @@ class Solution:
 
         if len(rooms) == 0:
             for p in periods:
-                conflict_courses = []
-                period_course = self.taken_period_room.get(p, {}).values()
-                no_room_courses = self.taken_period_room.get(p, {}).get('noRoom', [])
-                conflict_courses.extend(period_course)
-                conflict_courses.extend(no_room_courses)
-                conflict_courses = flatten(conflict_courses)
-
-                primary_course_conflicts = any(item in course["PrimaryCourses"] for item in conflict_courses)
-                same_teacher_conflicts = any(item in course["SameTeacherCourses"] for item in conflict_courses)
-
-                conflict = conflict_courses and (primary_course_conflicts or same_teacher_conflicts)
-
-                if not conflict:
+                if not self.has_conflict(p, course):
                     period = p
-                    if len(no_room_courses) == 0:
-                        self.taken_period_room[period]['noRoom'] = []
-                    self.taken_period_room[period]['noRoom'].append(course['Course'])
                     break
         else:
-            for p, r in pairs(periods, rooms):
-                taken = False
-                is_composite = ":" in r
-
-                if is_composite:
-                    com_rooms = r.split(':')[1].split(',')
-                    for c in com_rooms:
-                        if self.taken_period_room.get(p, {}).get(c, {}):
-                            taken = True
-                            break
-                else:
-                    taken = self.taken_period_room.get(p, {}).get(r, {})
-
-                if taken:
+            # the conflicts only depend on the period, the rooms are tried
+            # against the occupancy of the first periods without conflicts
+            occupied_rooms = self.occupied_rooms
+            forbidden_masks = self.instance.forbidden_masks
+            room_masks = self.instance.room_masks
+            scheduled_courses = self.evaluator.scheduled_courses
+            conflicts = self.instance.conflict_masks[course['CourseId']]
+            for p in periods:
+                if scheduled_courses[p] & conflicts:
                     continue
 
-                no_room_courses = self.taken_period_room.get(p, {}).get('noRoom', [])
-                period_course = self.taken_period_room.get(p, {}).values()
-
-                conflict_courses = []
-                conflict_courses.extend(period_course)
-                conflict_courses.extend(no_room_courses)
-                conflict_courses = flatten(conflict_courses)
-
-                primary_course_conflicts = any(item in course["PrimaryCourses"] for item in conflict_courses)
-                same_teacher_conflicts = any(item in course["SameTeacherCourses"] for item in conflict_courses)
-
-                conflict = conflict_courses and (primary_course_conflicts or same_teacher_conflicts)
-
-                if not taken and not conflict:
+                taken = occupied_rooms[p]
+                forbidden = forbidden_masks[p]
+                for r in rooms:
+                    if taken & room_masks[r] or forbidden >> r & 1:
+                        continue
                     period = p
-                    if is_composite:
-                        room = r.split(":")[0]
-                        com_rooms = r.split(':')[1].split(',')
-                        for c in com_rooms:
-                            self.taken_period_room[period][c] = course['Course']
-                    else:
-                        room = r
-                        self.taken_period_room[period][room] = course['Course']
+                    room = r
+                    break
+
+                if period != None:
+                    self.take_room(period, room)
                     break
 
+        if instrumentation.active != None:
+            instrumentation.count('periods probed', len(periods) if period == None else periods.index(period) + 1)
         return room, period
 
     # # # # # # # # # # # #
@@ -128,6 +256,14 @@ class Solution:
     # To Do calculate cost
     # # # # # # # # # # # #
 
+    # the propagation only reaches the other pending events of the same course
+    @staticmethod
+    def pending_by_course(courses):
+        pending = defaultdict(list)
+        for course in courses:
+            pending[course['CourseId']].append(course)
+        return pending
+
     def multiple_exams_constraint_propagation(self, course, courses, period):
         name = course['Course']
         exam_type = course['ExamType']
@@ -192,9 +328,8 @@ class Solution:
 
     def solve(self):
         self.cost = 0
-        self.assignments = []
 
-        grouped_courses = copy.deepcopy(self.instances)
+        grouped_courses = [[self.fresh_course(c) for c in group] for group in self.instances]
         total_events = 0
         courses = []
         to_group = random.randint(0,1) == 0
@@ -209,6 +344,7 @@ class Solution:
             courses.extend(group_courses)
 
         reallocations = 0
+        pending = self.pending_by_course(courses)
 
         while len(courses) > 0:
             course = courses.pop(0)
@@ -228,15 +364,17 @@ class Solution:
                 # print(reallocations, end="\r")
                 courses.insert(random.randint(int(len(courses)/2), len(courses)), course)
                 reallocations += 1
+                if instrumentation.active != None: instrumentation.count('construction reallocations')
                 continue
 
             if multiple_exams == True and predecessor_allocated == False:
                 # print(reallocations, end="\r")
                 courses.insert(random.randint(int(len(courses)/2), len(courses)), course)
                 reallocations += 1
+                if instrumentation.active != None: instrumentation.count('construction reallocations')
                 continue
 
-            rooms = course.get('PossibleRooms')
+            rooms = course.get('Rooms')
             if randomize_rooms == True: random.shuffle(rooms)
             periods = course.get('PossiblePeriods')
             if exam_order % 2 == 1: periods = self.distribute_periods(periods)
@@ -244,13 +382,15 @@ class Solution:
             room, period = self.available_room_period(rooms, periods, course)
 
             if period == None:
-                percentage = '{0:.2f}%'.format((total_events - len(courses)) * 100 / total_events)
-                print("Retrying... ", percentage, end="\r")
+                placed = (total_events - len(courses)) / total_events
+                runlog.report('construction failed', f"Retrying...  {placed * 100:.2f}%", end="\r", Placed=round(placed, 4))
                 return None
 
             self.last_period = period
-            if multiple_exams == True: self.multiple_exams_constraint_propagation(course, courses, period)
-            if two_part == True: self.two_part_constraint_propagation(course, courses, period)
+            siblings = [c for c in pending[course['CourseId']] if c is not course]
+            pending[course['CourseId']] = siblings
+            if multiple_exams == True: self.multiple_exams_constraint_propagation(course, siblings, period)
+            if two_part == True: self.two_part_constraint_propagation(course, siblings, period)
             
             # if smart_injection == True:
             #     def swap(list, pos1, pos2): list[pos1], list[pos2] = list[pos2], list[pos1]
@@ -264,24 +404,31 @@ class Solution:
             #             swap(courses, random.randint(_course_index - 1, len(courses)-1), _course_index)
             #             print("\t\t\tsmart_injection at", reallocations, end="\r")
 
-            event = Event(exam_order, exam_type, period, room, course_name, course)
-            self.add_event(course_name, event)
+            self.add_event(course['Event'], period, room)
 
-        self.cost = evaluate(self)
+        self.cost = self.evaluator.cost
         if self.with_validation: self.validate()
         return self.export()
 
     @staticmethod
-    def try_solving(instances, hard_constraints, instance_path = None, constraints = None):
+    def try_solving(instance, instance_path = None, multistart = None):
+        if multistart != None:
+            solution = multistart.solve(instance_path=instance_path)
+        else:
+            solution = Solution.construct(instance, instance_path)
+
+        if solution != None and Solution.observer != None:
+            Solution.observer.constructed(solution)
+        return solution
+
+    @staticmethod
+    def construct(instance, instance_path = None):
         solution_found = None
         solution = None
         attempt = 0
 
         while solution_found == None and attempt < 700:
-            solution = Solution(
-                copy.deepcopy(instances), hard_constraints, 
-                instance_path=instance_path, constraints=constraints
-            )
+            solution = Solution(instance, instance_path=instance_path)
             solution_found = solution.solve()
             solution.attempt = attempt
             attempt += 1
@@ -299,55 +446,17 @@ class Solution:
 
         if len(rooms) == 0:
             return room
-        else:
+        elif not self.has_conflict(period, course):
             for r in rooms:
-                taken = False
-                is_composite = ":" in r
-
-                if is_composite:
-                    com_rooms = r.split(':')[1].split(',')
-                    for c in com_rooms:
-                        if self.taken_period_room.get(period, {}).get(c, {}):
-                            taken = True
-                            break
-                else:
-                    taken = self.taken_period_room.get(period, {}).get(r, {})
-
-                if taken:
+                if self.room_taken(period, r):
                     continue
 
-                no_room_courses = self.taken_period_room.get(period, {}).get('noRoom', [])
-                period_course = self.taken_period_room.get(period, {}).values()
-
-                conflict_courses = []
-                conflict_courses.extend(period_course)
-                conflict_courses.extend(no_room_courses)
-                conflict_courses = flatten(conflict_courses)
+                room = r
+                self.take_room(period, room)
+                break
 
-                primary_course_conflicts = any(item in course["PrimaryCourses"] for item in conflict_courses)
-                same_teacher_conflicts = any(item in course["SameTeacherCourses"] for item in conflict_courses)
-
-                conflict = conflict_courses and (primary_course_conflicts or same_teacher_conflicts)
-
-                if not taken and not conflict:
-                    if is_composite:
-                        room = r.split(":")[0]
-                        com_rooms = r.split(':')[1].split(',')
-                        for c in com_rooms:
-                            self.taken_period_room[period][c] = course['Course']
-                    else:
-                        room = r
-                        self.taken_period_room[period][room] = course['Course']
-                    break
-
-        if current_room != None and room != None:
-            is_composite = ":" in current_room
-            if is_composite:
-                com_rooms = current_room.split(':')[1].split(',')
-                for c in com_rooms:
-                    self.taken_period_room[period][c] = None
-            else:
-                self.taken_period_room[period][current_room] = None
+        if current_room != NO_ROOM and room != None:
+            self.release_room(period, current_room)
 
         return room
 
@@ -355,26 +464,20 @@ class Solution:
         rooms_to_change = 50
         changed_rooms = 0
 
-        courses = []
-        grouped_courses = copy.deepcopy(self.instances)
-        for group in grouped_courses:
-            group_courses = group.copy()
-            courses.extend(group_courses)
-
-        for assignment in self.assignments:
+        for course_id in self.courses:
             if rooms_to_change == changed_rooms: break
-            for event in assignment.events:
-                course = [x for x in courses if x['Course'] == assignment.course and x['ExamType'] == event.part and x['ExamOrder'] == event.exam][0]
-                rooms = course['PossibleRooms']
-                new_room = self.new_available_room(rooms, event.room, event.period, course)
+            for event in self.course_events(course_id):
+                course = self.instance.events[event]
+                rooms = course['Rooms']
+                new_room = self.new_available_room(rooms, self.event_rooms[event], self.event_periods[event], course)
                 if new_room != None:
-                    event.room = new_room
+                    self.move_room(event, new_room)
                     changed_rooms += 1
                     # print("CHANGED ROOMS ", changed_rooms, end="\r")
 
         if self.with_validation: self.validate()
-        self.cost = evaluate(self)
-        return self.export()
+        self.cost = self.evaluator.cost
+        return True
 
     def mutate_courses(self, feedback=False, convergence=True):
         if feedback == True:
@@ -386,40 +489,23 @@ class Solution:
         changed_courses = 0
         pending_course_events = []
 
-        courses = []
-        total_events = 0
+        total_events = self.total_events
         randomize_rooms = random.randint(0,1) == 0
         reallocations = 0
 
-        grouped_courses = copy.deepcopy(self.instances)
-        for group in grouped_courses:
-            total_events += len(group)
-            group_courses = group.copy()
-            courses.extend(group_courses)
-
-        total_courses = len(self.assignments)
-        for assignment in random.sample(self.assignments, int(total_courses * amount_of_change)):
-            course_events = [x for x in courses if x['Course'] == assignment.course]
+        total_courses = len(self.courses)
+        for course_id in random.sample(self.courses, int(total_courses * amount_of_change)):
+            course_events = [self.fresh_course(self.instance.events[x]) for x in self.instance.course_events[course_id]]
             pending_course_events.extend(course_events)
 
-            for event in assignment.events:
-                room, period = event.room, event.period
-                if room == None:
-                    self.taken_period_room[period]['noRoom'].remove(assignment.course)
-                else:
-                    is_composite = ":" in room
-                    if is_composite:
-                        com_rooms = room.split(':')[1].split(',')
-                        for c in com_rooms:
-                            self.taken_period_room[period][c] = None
-                    else:
-                        self.taken_period_room[period][room] = None
-            self.course_assignment_ids.pop(assignment.course)
-            self.assignments.remove(assignment)
-
-        self.reindex_assignments()
+            for event in self.course_events(course_id):
+                if self.event_rooms[event] != NO_ROOM:
+                    self.release_room(self.event_periods[event], self.event_rooms[event])
+            self.remove_course(course_id)
+
         random.shuffle(pending_course_events)
         courses = pending_course_events
+        pending = self.pending_by_course(courses)
         while len(courses) > 0:
             course = courses.pop(0)
             course_name = course['Course']
@@ -440,15 +526,17 @@ class Solution:
                 # print(reallocations, end="\r")
                 courses.insert(random.randint(int(len(courses)/2), len(courses)), course)
                 reallocations += 1
+                if instrumentation.active != None: instrumentation.count('mutation reallocations')
                 continue
 
             if multiple_exams == True and predecessor_allocated == False:
                 # print(reallocations, end="\r")
                 courses.insert(random.randint(int(len(courses)/2), len(courses)), course)
                 reallocations += 1
+                if instrumentation.active != None: instrumentation.count('mutation reallocations')
                 continue
 
-            rooms = course.get('PossibleRooms')
+            rooms = course.get('Rooms')
             if randomize_rooms == True: random.shuffle(rooms)
             periods = course.get('PossiblePeriods')
             if distribute_periods and exam_order % 2 == 1: periods = self.distribute_periods(periods)
@@ -457,75 +545,84 @@ class Solution:
             room, period = self.available_room_period(rooms, periods, course)
 
             if period == None:
-                percentage = '{0:.2f}%'.format((total_events - len(courses)) * 100 / total_events)
-                print("Retrying mutate... ", percentage, end="\r")
+                placed = (total_events - len(courses)) / total_events
+                runlog.report('mutation failed', f"Retrying mutate...  {placed * 100:.2f}%", end="\r", Placed=round(placed, 4))
                 return None
 
             self.last_period = period
-            if multiple_exams == True: self.multiple_exams_constraint_propagation(course, courses, period)
-            if two_part == True: self.two_part_constraint_propagation(course, courses, period)
-
-            event = Event(exam_order, exam_type, period, room, course_name, course)
-            self.add_event(course_name, event)
-
-        self.cost = evaluate(self)
-        return self.export()
-
-    @staticmethod
-    def try_mutating(solution):
+            siblings = [c for c in pending[course['CourseId']] if c is not course]
+            pending[course['CourseId']] = siblings
+            if multiple_exams == True: self.multiple_exams_constraint_propagation(course, siblings, period)
+            if two_part == True: self.two_part_constraint_propagation(course, siblings, period)
+
+            self.add_event(course['Event'], period, room)
+
+        self.cost = self.evaluator.cost
+        return True
+
+    """
+    Mutate in place -
+    Applies a random mutation to this solution, undoing the failed attempts.
+    Wrap it in begin() and commit() or rollback() to decide on the neighbour
+    """
+    def try_move(self):
         mutation_success = None
-        neighbour_solution = None
         attempt = 0
         to_mutate_courses = random.randint(0,1) > 0.2
 
         while mutation_success == None and attempt < 700:
-            neighbour_solution = copy.deepcopy(solution)
-            neighbour_solution.attempt = attempt
+            self.begin()
+            self.attempt = attempt
             if to_mutate_courses:
-                mutation_success = neighbour_solution.mutate_courses()
+                mutation_success = self.mutate_courses()
             else:
-                mutation_success = neighbour_solution.mutate_rooms()
+                mutation_success = self.mutate_rooms()
 
+            if mutation_success == None: self.rollback()
+            else: self.commit()
             attempt += 1
 
-        neighbour_solution.ancestors += 1
-
         if attempt < 700:
-            return neighbour_solution
+            self.ancestors += 1
+            if Solution.observer != None: Solution.observer.moved(self)
+            return True
         else:
             print("Could not mutate in time!")
-            return None
+            return False
 
     def validate(self):
         start_time = time.time()
-        validation_results = validate_solution(self.instance_path, self.export(), None, None, None, False)
+        session = validation_session(self.instance_path)
+        assignments = []
+        for course in self.courses:
+            events = []
+            for event in self.course_events(course):
+                _, exam, part = self.instance.event_keys[event]
+                events.append(session.event(exam, part, self.event_periods[event], self.instance.room_name(self.event_rooms[event])))
+            assignments.append((self.instance.course_names[course], events))
+        validation_results = session.validate(assignments)
         end_time = time.time()
         validation_results['finished_for'] = f"{end_time-start_time:.2f}s."
         self.validation_results = validation_results
 
-    def reindex_assignments(self):
-        self.course_assignment_ids = {}
-        for index, assignment in enumerate(self.assignments):
-            course_name = assignment.course
-            self.course_assignment_ids[course_name] = index
-            self.last_assignment_id = index + 1
-
-    def add_event(self, course_name, event):
-        if course_name not in self.course_assignment_ids.keys():
-            assignment = Assignment(course_name)
-            self.course_assignment_ids[course_name] = self.last_assignment_id
-            self.assignments.append(assignment)
-            self.last_assignment_id += 1
-        else:
-            assignment_id = self.course_assignment_ids[course_name]
-            assignment = self.assignments[assignment_id]
-
-        assignment.add_event(event)
-
+    # the assignments are only built here, from the event arrays
     def export(self):
         assignments = []
-        for assignment in self.assignments:
-            assignments.append(assignment.export())
+        for course in self.courses:
+            events = []
+            for event in self.course_events(course):
+                name, exam, part = self.instance.event_keys[event]
+                events.append({
+                    'Exam': exam,
+                    'Part': part,
+                    'Period': self.event_periods[event],
+                    'Room': self.instance.room_name(self.event_rooms[event]),
+                    'Course': name
+                })
+            assignments.append({
+                'Course': self.instance.course_names[course],
+                'Events': events
+            })
 
         return {
             'Assignments': assignments,
@@ -536,41 +633,18 @@ class Solution:
     def import_data(self, data):
         pass
 
+    # (event id, period, room) of every event, in the order they were added
+    def placements(self):
+        return [
+            (event, self.event_periods[event], self.event_rooms[event])
+            for course in self.courses for event in self.course_events(course)
+        ]
 
-class Assignment:
-    def __init__(self, course):
-        self.course = course
-        self.events = []
-
-    def add_event(self, event):
-        self.events.append(event)
-
-    def export(self):
-        export_events = []
-        for event in self.events:
-            export_event = event.export()
-            export_events.append(export_event)
-
-        return {
-            'Course': self.course,
-            'Events': export_events
-        }
-
-
-class Event:
-    def __init__(self, exam, part, period, room, course, course_metadata={}):
-        self.exam = exam
-        self.part = part
-        self.period = period
-        self.room = room
-        self.course = course
-        self.course_metadata = course_metadata
-
-    def export(self):
-        return {
-            'Exam': self.exam,
-            'Part': self.part,
-            'Period': self.period,
-            'Room': self.room,
-            'Course': self.course
-        }
\ No newline at end of file
+    @staticmethod
+    def rebuild(instance, placements, instance_path = None):
+        solution = Solution(instance, instance_path=instance_path)
+        for event, period, room in placements:
+            if room != NO_ROOM: solution.take_room(period, room)
+            solution.add_event(event, period, room)
+        solution.cost = solution.evaluator.cost
+        return solution
@@ -0,0 +1,77 @@
+import random
+import itertools
+from solution import Solution
+from budget import Budget
+from neighbourhoods import Neighbourhood, apply_move, move_cost, move_attributes
+
+"""
+Tabu search -
+A search over the explicit moves of neighbourhoods.py. Every iteration
+scores a random sample of the feasible moves by applying them to the
+incremental evaluator and rolling them back, and applies the best one
+that is not tabu, or that is tabu but improves on the best solution
+(aspiration). An event leaving a period may not come back to it for
+`tenure` iterations. After `stagnation` iterations without a new best
+solution, the solution is perturbed with the mutation operators and the
+tabu list is cleared
+"""
+def tabu_search(
+    instance,
+    instance_path,
+    iterations=1000,
+    budget=None,
+    multistart=None,
+    candidates=200,
+    tenure=10,
+    stagnation=500,
+    solution=None,
+):
+    budget = budget or Budget()
+    if solution == None: solution = Solution.try_solving(instance, instance_path=instance_path, multistart=multistart)
+    if solution == None: return None
+    best = solution.copy()
+    neighbourhood = Neighbourhood(solution)
+    tabu = {}
+    last_improvement = 0
+
+    for n in itertools.count() if budget.bounded() else range(iterations):
+        if budget.expired(): break
+        neighbourhood.index()
+
+        chosen, chosen_cost = None, None
+        sampled = False
+        for move in neighbourhood.sample(candidates):
+            sampled = True
+            cost = move_cost(solution, move)
+            budget.spend()
+            if cost == None: continue
+            # every scored move is reported, the unit the budget is spent in
+            if Solution.observer != None: Solution.observer.moved(solution)
+            _, targets = move_attributes(solution, move)
+            is_tabu = any(tabu.get(target, -1) >= n for target in targets)
+            if is_tabu and cost >= best.cost: continue
+            if chosen_cost == None or cost < chosen_cost: chosen, chosen_cost = move, cost
+            if budget.expired(): break
+        # an empty sample still counts, or an evaluation budget never runs out
+        if not sampled: budget.spend()
+
+        if chosen != None:
+            sources, _ = move_attributes(solution, chosen)
+            solution.begin()
+            apply_move(solution, chosen)
+            solution.cost = solution.evaluator.cost
+            solution.commit()
+            for source in sources: tabu[source] = n + tenure + random.randint(0, tenure)
+
+        if solution.cost < best.cost:
+            best = solution.copy()
+            last_improvement = n
+        elif n - last_improvement >= stagnation:
+            solution.begin()
+            if solution.try_move(): solution.commit()
+            else: solution.rollback()
+            budget.spend()
+            tabu = {}
+            last_improvement = n
+
+    return best
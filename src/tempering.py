@@ -0,0 +1,169 @@
+import io
+import os
+import math
+import random
+import signal
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from solution import Solution
+from budget import Budget
+from neighbourhoods import Neighbourhood, apply_move, move_cost
+from islands import epoch_budget
+import runlog
+
+"""
+Parallel tempering -
+Replicas of the solution run Metropolis chains over the moves of
+neighbourhoods.py at fixed temperatures, one per worker process, in epochs.
+The temperatures form a geometric ladder, calibrated on the cost changes of
+random moves of the first solution, so that they follow the cost scale of
+the instance. Between the epochs neighbouring replicas exchange their
+temperatures with the replica exchange probability, so that good solutions
+cool down and poor ones heat up
+"""
+worker_instance = None
+worker_instance_path = None
+
+def init_worker(instance, instance_path):
+    global worker_instance, worker_instance_path
+    worker_instance = instance
+    worker_instance_path = instance_path
+    # the parent stops the replicas between epochs, see Budget.handle_interrupts
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    runlog.active = None
+    Solution.observer = None
+
+# the chain at one temperature, returns its last and its best solution
+def metropolis(solution, temperature, budget):
+    neighbourhood = Neighbourhood(solution)
+    neighbourhood.index()
+    best = solution.copy()
+
+    while not budget.expired():
+        move = next(neighbourhood.sample(1), None)
+        # an empty sample still counts, or an evaluation budget never runs out
+        budget.spend()
+        if move == None: continue
+
+        solution.begin()
+        if not apply_move(solution, move):
+            solution.rollback()
+            continue
+        delta = solution.evaluator.cost - solution.cost
+        if delta <= 0 or random.random() < math.exp(-delta / temperature):
+            solution.cost = solution.evaluator.cost
+            solution.commit()
+            neighbourhood.index()
+            if solution.cost < best.cost: best = solution.copy()
+        else:
+            solution.rollback()
+
+    return solution, best
+
+def run_replica(temperature, seed, placements, time_limit, evaluations):
+    random.seed(seed)
+    solution = Solution.rebuild(worker_instance, placements, worker_instance_path)
+    budget = Budget(time_limit, evaluations)
+    with contextlib.redirect_stdout(io.StringIO()):
+        solution, best = metropolis(solution, temperature, budget)
+    return (solution.cost, solution.placements()), (best.cost, best.placements()), budget.spent
+
+"""
+Temperature ladder -
+The temperatures are calibrated on the worsening moves of a local optimum,
+reached by a short descent from a copy of the first solution: the hottest
+replica accepts the median worsening with probability `hot`, the coldest
+one accepts the smallest tenth of them with probability `cold`
+"""
+def calibrate(solution, descent = 2000, samples = 300, hot = 0.5, cold = 0.01):
+    solution = solution.copy()
+    neighbourhood = Neighbourhood(solution)
+    neighbourhood.index()
+    for move in neighbourhood.sample(descent):
+        solution.begin()
+        if apply_move(solution, move) and solution.evaluator.cost <= solution.cost:
+            solution.cost = solution.evaluator.cost
+            solution.commit()
+            neighbourhood.index()
+        else:
+            solution.rollback()
+
+    worsening = []
+    for move in neighbourhood.sample(samples):
+        cost = move_cost(solution, move)
+        if cost != None and cost > solution.cost: worsening.append(cost - solution.cost)
+    if len(worsening) < 10: return 1, 10
+    worsening.sort()
+    return worsening[len(worsening) // 10] / -math.log(cold), worsening[len(worsening) // 2] / -math.log(hot)
+
+def ladder(replicas, t_min, t_max):
+    if replicas == 1: return [t_min]
+    return [t_min * (t_max / t_min) ** (i / (replicas - 1)) for i in range(replicas)]
+
+class ParallelTempering:
+    def __init__(self, instance, instance_path, replicas = None, exchange_interval = 1, exchange_evaluations = 2000, epochs = 100, temperatures = None):
+        self.instance = instance
+        self.instance_path = instance_path
+        self.replicas = replicas or os.cpu_count()
+        self.exchange_interval = exchange_interval
+        self.exchange_evaluations = exchange_evaluations
+        self.epochs = epochs
+        self.temperatures = temperatures
+        self.pool = ProcessPoolExecutor(max_workers=self.replicas, initializer=init_worker, initargs=(instance, instance_path))
+
+    # the states are ordered from the coldest to the hottest temperature,
+    # exchanging the even or the odd neighbours in turn
+    def exchange(self, states, temperatures, epoch):
+        exchanged = 0
+        for i in range(epoch % 2, len(states) - 1, 2):
+            (cold, _), (hot, _) = states[i], states[i + 1]
+            exponent = (1 / temperatures[i] - 1 / temperatures[i + 1]) * (cold - hot)
+            if exponent >= 0 or random.random() < math.exp(exponent):
+                states[i], states[i + 1] = states[i + 1], states[i]
+                exchanged += 1
+        return exchanged
+
+    def solve(self, budget = None, solution = None):
+        budget = budget or Budget()
+        if solution == None: solution = Solution.try_solving(self.instance, instance_path=self.instance_path)
+        if solution == None: return None
+
+        temperatures = self.temperatures or calibrate(solution)
+        temperatures = ladder(self.replicas, *temperatures)
+        runlog.report('temperatures', f"Temperatures {', '.join(f'{t:.2f}' for t in temperatures)}.",
+            Temperatures=[round(t, 4) for t in temperatures])
+        states = [(solution.cost, solution.placements())] * self.replicas
+        best = states[0]
+
+        for epoch in itertools.count() if budget.bounded() else range(self.epochs):
+            if budget.expired(): break
+            time_limit, evaluations = epoch_budget(budget, self.replicas, self.exchange_interval, self.exchange_evaluations)
+            futures = [
+                self.pool.submit(run_replica, temperature, random.randrange(2**31), state[1], time_limit, evaluations)
+                for temperature, state in zip(temperatures, states)
+            ]
+            results = [future.result() for future in futures]
+            budget.spend(sum(spent for _, _, spent in results))
+            states = [state for state, _, _ in results]
+
+            epoch_best = min((replica_best for _, replica_best, _ in results), key=lambda state: state[0])
+            if epoch_best[0] < best[0]:
+                best = epoch_best
+                if Solution.observer != None:
+                    Solution.observer.accepted(Solution.rebuild(self.instance, best[1], instance_path=self.instance_path))
+            exchanged = self.exchange(states, temperatures, epoch)
+            costs = [state[0] for state in states]
+            runlog.report('exchange', f"Epoch {epoch}: best cost {best[0]}, replicas {costs}, {exchanged} exchanged",
+                Epoch=epoch, BestCost=best[0], Costs=costs, Exchanged=exchanged)
+
+        return Solution.rebuild(self.instance, best[1], instance_path=self.instance_path)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
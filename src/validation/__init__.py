@@ -1,7 +1,8 @@
-from validation.instance_loader import Instance
+from validation.instance_loader import Instance, cache_directory
 from validation.solution_loader import Solution
 from validation.solution_validator import SolutionValidator
 from validation.instance_validator import InstanceValidator
+from validation.session import ValidationSession
 import json
 import os
 import sys
@@ -15,6 +16,8 @@ VERSION = "0.3.1"
 
 force_overwrite = False
 
+sessions = {}
+
 def validate_instance(instance_file, instance_format, output):
     '''
     Validates an instance and computes a few instance features.
@@ -40,7 +43,7 @@ def validate_instance(instance_file, instance_format, output):
         instance_format = instance_file.split(".")[-1]
 
     # activate validator, print result
-    result = InstanceValidator.validate(inst_content, instance_format)
+    result = InstanceValidator.validate(inst_content, instance_format, cache_directory(instance_file))
     if not output:
         return result
     else:
@@ -73,7 +76,7 @@ def validate_solution(instance_file, solution_json, instance_format, solution_fo
     sol_content = json.dumps(solution_json)
 
     # activate validator, print result
-    result = SolutionValidator.validate(inst_content, instance_format, sol_content, solution_format, ignore_forbidden)
+    result = SolutionValidator.validate(inst_content, instance_format, sol_content, solution_format, ignore_forbidden, cache_directory(instance_file))
     if not output:
         return result
     else:
@@ -81,6 +84,14 @@ def validate_solution(instance_file, solution_json, instance_format, solution_fo
             with open(output, 'w') as f:
                 f.write(json.dumps(result, indent=4))
 
+def validation_session(instance_file):
+    '''
+        Returns the validation session of an instance file, the instance is loaded on first use only.
+    '''
+    if instance_file not in sessions:
+        sessions[instance_file] = ValidationSession(instance_file)
+    return sessions[instance_file]
+
 # FIXME
 # REQUIRES PANDAS, works with Python3 as of now
 def instance_features(instances, output):
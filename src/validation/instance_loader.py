@@ -1,8 +1,11 @@
 import json
+import os
+import hashlib
 from itertools import combinations, product
 import math
 from collections import defaultdict, OrderedDict, namedtuple
 from validation.constants import *
+import numpy as np
 import logging
 try:
     import coloredlogs
@@ -14,6 +17,17 @@ log = logging.getLogger('costs')
 
 Event = namedtuple('Event', ['course', 'exam', 'part'])
 
+# the code version of the cached artifacts: this loader and the cost weights
+LOADER_VERSION = hashlib.sha1()
+for source in [__file__, os.path.join(os.path.dirname(__file__), 'constants.py')]:
+    with open(source, 'rb') as f:
+        LOADER_VERSION.update(f.read())
+LOADER_VERSION = LOADER_VERSION.digest()
+
+def cache_directory(instance_file):
+    '''The directory of the compiled artifacts of an instance file, next to it'''
+    return os.path.join(os.path.dirname(os.path.abspath(instance_file)), '.cache')
+
 class Course(object):
     def __init__(self, teachers, **kwargs):
         self.name = kwargs.get('Course')
@@ -122,8 +136,8 @@ class Instance(object):
         return str.join('', output)
     
 
-    def __init__(self, inst_content, inst_format=None):
-        '''Loads an instance object from the instance content as string'''
+    def __init__(self, inst_content, inst_format=None, cache_dir=None):
+        '''Loads an instance object from the instance content as string, reusing the compiled artifacts in cache_dir if given'''
 
         if inst_format not in self.formats:
             raise ValueError('Unsupported instance format: ' + str(inst_format) + '. Try one of {' + ','.join(map(str,self.formats)) + '} instead.')
@@ -226,100 +240,106 @@ class Instance(object):
                     if len(compatible_rooms) < number:
                         raise ValueError('Course {} requires {} rooms of type {} for {} but only {} are available'.format(course.name, number, type, course.parts[part], len(compatible_rooms)))                                    
                     
-            # explicitly compute the set of available periods for each course (not forbidden) 
-            for course in self.courses.values():
-                # domain consistency: remove forbidden values
-            #    start_part = course.parts[0]
-                course.available_periods = [[set(range(self.periods)) for __ in range(len(course.parts))] for ___ in range(course.number_of_exams)]
-                for part in range(len(course.parts)):
-                    for period, constraints in course.period_constraints[part].items():
-                        for (exam, level) in constraints:
-                            if level != 'Forbidden':
-                                continue
-                            course.available_periods[exam][part].discard(period)
-                # second part of domain consistency: remove periods if not enough rooms are available at that time
-                for part in range(len(course.parts)):
-                    if course.rooms[part] is None:
-                        continue
-                    type, number = course.rooms[part]
-                    compatible_rooms = set(filter(lambda r: r.type == type, self.rooms.values()))
-                    for exam in range(course.number_of_exams):
-                        periods_to_remove = []
-                        for p in course.available_periods[exam][part]:
-                            available_rooms_at_p = sum(1 if r.constraints.get(p) != 'Forbidden' else 0 for r in compatible_rooms)
-                            if available_rooms_at_p < number:
-                                periods_to_remove.append(p)
-                        for p in periods_to_remove:
-                                course.available_periods[exam][part].discard(p)
-                # third part of domain consistency: if it's a sameday exam, then some periods can be removed
-                if course.same_day:
-                    parts = len(course.parts)
-                    available_slots = [set(range(self.slots_per_day)) for __ in range(parts)]
-                    for part in range(parts):
-                        for slot in range(self.slots_per_day):
-                            if slot < part:
-                                available_slots[part].discard(slot)
-                            remaining_parts = parts - 1 - part
-                            if slot + remaining_parts >= self.slots_per_day:
-                                available_slots[part].discard(slot)
-                        for d in range(self.periods // self.slots_per_day):
-                            for s in range(self.slots_per_day):
-                                period = d * self.slots_per_day + s
-                                if s not in available_slots[part]:
-                                    for exam in range(course.number_of_exams):
-                                        course.available_periods[exam][part].discard(period)
-                    
-                # filter out constraints (min distance, and also room unavailabilities)            
-                def filter_constraint(D0, D1, t):
-                    a, b = t
-                    # consider the constraint $a \leq x_1 - x_0 \leq b$
-                    # these are the propagation rules:
-                    d0 = len(D0)
-                    d1 = len(D1)
-                    # propagation rules for $x_0 + a \leq x_1$
-                    # 1.1 $\forall x \in D_0 \quad x + a \leq \max D_1$:
-                    D0 = set(filter(lambda x: x <= max(D1) - a, D0))
-                    # 1.2. $\forall x \in D_1 \quad \min D_0 + a \leq x$ 
-                    D1 = set(filter(lambda x: min(D0) + a <= x, D1))
-                    # propagation rules for $x_1 \leq x_0 + b$
-                    # 2.1. $\forall x \in D_1 \quad x \leq \max D_0 + b$
-                    D1 = set(filter(lambda x: x <= max(D0) + b, D1))
-                    # 2.2. $\forall x \in D_0 \quad \min D_1 \leq x + b$
-                    D0 = set(filter(lambda x: min(D1) - b <= x, D0))
-                    return len(D0) < d0 or len(D1) < d1, D0, D1
-                    
-                
-                changed = True
-                # constraint propagation up to fixpoint
-                try:                
-                    while changed:
-                        changed = False
-                        # first ensure that the difference between the first parts is kept
-                        part = 0
-                        for exam_a, exam_b in combinations(range(course.number_of_exams), 2):
-                            c, course.available_periods[exam_a][part], course.available_periods[exam_b][part] = filter_constraint(course.available_periods[exam_a][part], course.available_periods[exam_b][part], course.distances_between_exams)
-                            changed = changed or c
-                        # secondly ensure that the inner distance between parts is kept
-                        for exam in range(course.number_of_exams):                    
-                            for part_a in range(len(course.parts) - 1):
-                                part_b = part_a + 1
-                                c, course.available_periods[exam][part_a], course.available_periods[exam][part_b] = filter_constraint(course.available_periods[exam][part_a], course.available_periods[exam][part_b], course.part_distances[part_a])
-                                changed = changed or c
-                                                    
-                except ValueError: # a domain has become empty
-                    pass
-
             self.events = [] # this is the exploded viewpoint of each event
             for course in self.courses.values():
                 for exam in range(course.number_of_exams):
                     for part in course.parts:
                         self.events.append(Event(course.name, exam, part))
 
-            self._compute_easylocal_representation()  
+            cache_file = self._cache_file(inst_content, cache_dir)
+            if not self._load_cache(cache_file):
+                self._compute_available_periods()
+                self._compute_easylocal_representation()  
+                self._compute_matrices()
+                self._save_cache(cache_file)
 
     def __str__(self):
         return '{}'.format(self.periods)
 
+    def _compute_available_periods(self):
+        # explicitly compute the set of available periods for each course (not forbidden) 
+        for course in self.courses.values():
+            # domain consistency: remove forbidden values
+        #    start_part = course.parts[0]
+            course.available_periods = [[set(range(self.periods)) for __ in range(len(course.parts))] for ___ in range(course.number_of_exams)]
+            for part in range(len(course.parts)):
+                for period, constraints in course.period_constraints[part].items():
+                    for (exam, level) in constraints:
+                        if level != 'Forbidden':
+                            continue
+                        course.available_periods[exam][part].discard(period)
+            # second part of domain consistency: remove periods if not enough rooms are available at that time
+            for part in range(len(course.parts)):
+                if course.rooms[part] is None:
+                    continue
+                type, number = course.rooms[part]
+                compatible_rooms = set(filter(lambda r: r.type == type, self.rooms.values()))
+                for exam in range(course.number_of_exams):
+                    periods_to_remove = []
+                    for p in course.available_periods[exam][part]:
+                        available_rooms_at_p = sum(1 if r.constraints.get(p) != 'Forbidden' else 0 for r in compatible_rooms)
+                        if available_rooms_at_p < number:
+                            periods_to_remove.append(p)
+                    for p in periods_to_remove:
+                            course.available_periods[exam][part].discard(p)
+            # third part of domain consistency: if it's a sameday exam, then some periods can be removed
+            if course.same_day:
+                parts = len(course.parts)
+                available_slots = [set(range(self.slots_per_day)) for __ in range(parts)]
+                for part in range(parts):
+                    for slot in range(self.slots_per_day):
+                        if slot < part:
+                            available_slots[part].discard(slot)
+                        remaining_parts = parts - 1 - part
+                        if slot + remaining_parts >= self.slots_per_day:
+                            available_slots[part].discard(slot)
+                    for d in range(self.periods // self.slots_per_day):
+                        for s in range(self.slots_per_day):
+                            period = d * self.slots_per_day + s
+                            if s not in available_slots[part]:
+                                for exam in range(course.number_of_exams):
+                                    course.available_periods[exam][part].discard(period)
+                
+            # filter out constraints (min distance, and also room unavailabilities)            
+            def filter_constraint(D0, D1, t):
+                a, b = t
+                # consider the constraint $a \leq x_1 - x_0 \leq b$
+                # these are the propagation rules:
+                d0 = len(D0)
+                d1 = len(D1)
+                # propagation rules for $x_0 + a \leq x_1$
+                # 1.1 $\forall x \in D_0 \quad x + a \leq \max D_1$:
+                D0 = set(filter(lambda x: x <= max(D1) - a, D0))
+                # 1.2. $\forall x \in D_1 \quad \min D_0 + a \leq x$ 
+                D1 = set(filter(lambda x: min(D0) + a <= x, D1))
+                # propagation rules for $x_1 \leq x_0 + b$
+                # 2.1. $\forall x \in D_1 \quad x \leq \max D_0 + b$
+                D1 = set(filter(lambda x: x <= max(D0) + b, D1))
+                # 2.2. $\forall x \in D_0 \quad \min D_1 \leq x + b$
+                D0 = set(filter(lambda x: min(D1) - b <= x, D0))
+                return len(D0) < d0 or len(D1) < d1, D0, D1
+                
+            
+            changed = True
+            # constraint propagation up to fixpoint
+            try:                
+                while changed:
+                    changed = False
+                    # first ensure that the difference between the first parts is kept
+                    part = 0
+                    for exam_a, exam_b in combinations(range(course.number_of_exams), 2):
+                        c, course.available_periods[exam_a][part], course.available_periods[exam_b][part] = filter_constraint(course.available_periods[exam_a][part], course.available_periods[exam_b][part], course.distances_between_exams)
+                        changed = changed or c
+                    # secondly ensure that the inner distance between parts is kept
+                    for exam in range(course.number_of_exams):                    
+                        for part_a in range(len(course.parts) - 1):
+                            part_b = part_a + 1
+                            c, course.available_periods[exam][part_a], course.available_periods[exam][part_b] = filter_constraint(course.available_periods[exam][part_a], course.available_periods[exam][part_b], course.part_distances[part_a])
+                            changed = changed or c
+                                                
+            except ValueError: # a domain has become empty
+                pass
+
     def _compute_easylocal_representation(self):       
         # redundant roomed event, to be determined at first to decide whether to include or not the dummy room
         self.roomed_event = [1] * len(self.events)
@@ -511,6 +531,78 @@ class Instance(object):
             self.roomset_overlap[r2][r2] = 1
 
 
+    def _compute_matrices(self):
+        # ndarray copies of the easylocal representation, used by the vectorized solution validation
+        events = len(self.events)
+        rooms = len(self.rooms) + 1 if self.dummy_room_required else len(self.rooms)
+        def matrix(lines, rows, columns):
+            return np.array(lines, dtype=np.int64).reshape(rows, columns)
+        self.conflicts_matrix = matrix(self.conflicts, events, events)
+        self.distance_weight_matrix = matrix(self.distance_weight, events, events)
+        self.min_distances_matrix = matrix(self.min_distances, events, events)
+        self.max_distances_matrix = matrix(self.max_distances, events, events)
+        self.precedence_matrix = matrix(self.precedence, events, events)
+        self.event_period_constraints_matrix = matrix(self.event_period_constraints, events, self.periods)
+        self.event_room_constraints_matrix = matrix(self.event_room_constraints, events, rooms)
+        self.room_period_constraints_matrix = matrix(self.room_period_constraints, rooms, self.periods)
+        self.roomset_overlap_matrix = matrix(self.roomset_overlap, rooms, rooms)
+
+    # compiled artifacts, keyed by the instance content and LOADER_VERSION
+    CACHED_LISTS = ['conflicts', 'distance_weight', 'min_distances', 'max_distances', 'precedence',
+        'event_period_constraints', 'event_room_constraints', 'room_period_constraints', 'roomset_overlap']
+
+    @staticmethod
+    def _cache_file(inst_content, cache_dir):
+        if cache_dir is None:
+            return None
+        key = hashlib.sha1(LOADER_VERSION + inst_content.encode()).hexdigest()
+        return os.path.join(cache_dir, f'{key}.npz')
+
+    def _load_cache(self, cache_file):
+        if cache_file is None or not os.path.isfile(cache_file):
+            return False
+        try:
+            with np.load(cache_file) as data:
+                arrays = {name: data[name] for name in data.files}
+        except Exception:
+            return False
+
+        self.roomed_event = arrays['roomed_event'].tolist()
+        self.dummy_room_required = not all(self.roomed_event)
+        for name in self.CACHED_LISTS:
+            setattr(self, f'{name}_matrix', arrays[name].astype(np.int64))
+            setattr(self, name, arrays[name].tolist())
+        # available periods, one row per event
+        events = iter(arrays['available_periods'])
+        for course in self.courses.values():
+            course.available_periods = [[set(np.flatnonzero(next(events)).tolist()) for __ in course.parts] for ___ in range(course.number_of_exams)]
+        return True
+
+    def _save_cache(self, cache_file):
+        if cache_file is None:
+            return
+        available_periods = np.zeros((len(self.events), self.periods), dtype=bool)
+        for e, event in enumerate(self.events):
+            course = self.courses[event.course]
+            available_periods[e, list(course.available_periods[event.exam][course.parts.index(event.part)])] = True
+        # stored with the smallest integer type that holds their values
+        def compact(matrix):
+            if matrix.size == 0:
+                return matrix
+            return matrix.astype(np.result_type(np.min_scalar_type(matrix.min()), np.min_scalar_type(matrix.max())))
+        arrays = {name: compact(getattr(self, f'{name}_matrix')) for name in self.CACHED_LISTS}
+        arrays['roomed_event'] = np.array(self.roomed_event, dtype=np.int64)
+        arrays['available_periods'] = available_periods
+        # written aside and moved, concurrent loads never see a partial file
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            temporary_file = f'{cache_file}.{os.getpid()}.tmp'
+            with open(temporary_file, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(temporary_file, cache_file)
+        except OSError:
+            pass
+
     def to_dzn(self):
         def matrix_repr(lines, processing=str):
             p = "["
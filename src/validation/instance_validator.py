@@ -19,7 +19,7 @@ class InstanceValidator(object):
             raise ValueError(message.format(v1, v2))
     
     @classmethod
-    def validate(cls, inst_content, inst_format):
+    def validate(cls, inst_content, inst_format, cache_dir=None):
         '''Takes an instance as input string, evaluates its validity, computes features'''
 
         # correctly handle None format
@@ -29,7 +29,7 @@ class InstanceValidator(object):
         # initialize feature map
         features = {}
 
-        instance = Instance(inst_content, inst_format) 
+        instance = Instance(inst_content, inst_format, cache_dir)
         if hasattr(instance, 'courses'):
             features['courses'] = len(instance.courses)
         else:
@@ -0,0 +1,30 @@
+from validation.instance_loader import Instance, cache_directory
+from validation.solution_loader import Solution, EventAssignment
+from validation.solution_validator import SolutionValidator
+
+class ValidationSession(object):
+    '''Validates several solutions of the same instance, which is loaded only once'''
+
+    def __init__(self, instance_file, instance_format=None):
+        '''Loads the instance of the given file, compiled artifacts are cached next to it'''
+        with open(instance_file) as f:
+            inst_content = f.read()
+
+        if not instance_format:
+            instance_format = instance_file.split(".")[-1]
+
+        self.instance_file = instance_file
+        self.instance = Instance(inst_content, instance_format, cache_directory(instance_file))
+
+    @staticmethod
+    def event(exam, part, period, room):
+        '''An event assignment, room being the room name or None'''
+        return EventAssignment(Exam=exam, Part=part, Period=period, Room=room)
+
+    def validate(self, assignments, ignore_forbidden=False):
+        '''
+        Validates a solution given as (course, events) pairs, each event built with event(),
+        with no serialization of the solution; returns the same result as validate_solution.
+        '''
+        solution = Solution.from_assignments(assignments, self.instance)
+        return SolutionValidator.validate_loaded(self.instance, solution, Solution.default_format, ignore_forbidden)
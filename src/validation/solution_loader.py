@@ -47,16 +47,33 @@ class Solution(object):
             try:
                 data = json.loads(sol_content)
                 self.assignments = OrderedDict([(a.get('Course'), sorted([EventAssignment(**e) for e in a.get('Events')], key=lambda e: e.exam)) for a in data.get('Assignments', [])])  
-                self.timetable = []              
-                for event in instance.events:
-                    e = next(filter(lambda e: e.exam == event.exam and e.part == event.part, self.assignments[event.course]))   
-                    if e.room is not None:
-                        for i, r in enumerate(instance.ordered_rooms):
-                            if r.name == e.room:
-                                break
-                        room = i
-                    else:
-                        room = len(instance.ordered_rooms)
-                    self.timetable.append((e.period + 1, room + 1))
+                self._compute_timetable(instance)
             except Exception as e:
-                raise ValueError(str(e))
\ No newline at end of file
+                raise ValueError(str(e))
+
+    @classmethod
+    def from_assignments(cls, assignments, instance):
+        '''Builds a solution from (course, events) pairs, each event an EventAssignment, without going through its content'''
+        solution = cls.__new__(cls)
+        solution.computed_cost = None
+        try:
+            solution.assignments = OrderedDict((course, sorted(events, key=lambda e: e.exam)) for course, events in assignments)
+            solution._compute_timetable(instance)
+        except Exception as e:
+            raise ValueError(str(e))
+        return solution
+
+    def _compute_timetable(self, instance):
+        rooms = {r.name: i for i, r in enumerate(instance.ordered_rooms)}
+        events = {}
+        for course, assignment in self.assignments.items():
+            for e in assignment:
+                events.setdefault((course, e.exam, e.part), e)
+        self.timetable = []
+        for event in instance.events:
+            e = events[(event.course, event.exam, event.part)]
+            if e.room is not None:
+                room = rooms[e.room]
+            else:
+                room = len(instance.ordered_rooms)
+            self.timetable.append((e.period + 1, room + 1))
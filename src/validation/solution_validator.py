@@ -5,6 +5,7 @@ from validation.instance_loader import Instance
 from validation.solution_loader import Solution
 from validation.constants import *
 from helpers import log
+import numpy as np
 
 try:
     import coloredlogs
@@ -16,7 +17,7 @@ class SolutionValidator(object):
     '''Solution validation logic'''    
 
     @classmethod
-    def validate(cls, inst_content, inst_format, sol_content, sol_format, ignore_forbidden=False):
+    def validate(cls, inst_content, inst_format, sol_content, sol_format, ignore_forbidden=False, cache_dir=None):
         '''Takes a solution and an instance input as string, evaluates its validity, computes features'''
 
         # correctly handle None format
@@ -27,13 +28,18 @@ class SolutionValidator(object):
         if not sol_format:
             sol_format = Solution.default_format      
 
+        instance = Instance(inst_content, inst_format, cache_dir)
+        solution = Solution(sol_content, sol_format, instance)
+        return cls.validate_loaded(instance, solution, sol_format, ignore_forbidden)
+
+    @classmethod
+    def validate_loaded(cls, instance, solution, sol_format=None, ignore_forbidden=False):
+        '''Evaluates the validity of an already loaded solution, computes features'''
+
         # initialize costs
         cost_components = {}
         cost = None
 
-        instance = Instance(inst_content, inst_format)
-        solution = Solution(sol_content, sol_format, instance)
-
         # basic consistency checkings for assignment
         if solution.assignments: # this might be not available when not a json / json pair is provided
             cls.check_assignments(instance, solution, ignore_forbidden)
@@ -58,75 +64,9 @@ class SolutionValidator(object):
         }
 
         # timetable is now the reference, together with the matrix representation
-
-        # pair of events constraints
-        for e1, e2 in combinations(range(len(solution.timetable)), 2):
-            p1, r1 = solution.timetable[e1] 
-            p2, r2 = solution.timetable[e2]
-            p1, r1 = p1 - 1, r1 - 1
-            p2, r2 = p2 - 1, r2 - 1
-            # 1. they are in the same period 
-            if p1 == p2:
-                if instance.conflicts[e1][e2] == -1:
-                    cost_components['hard_components']['conflicts'] += instance.conflicts[e1][e2]
-                    log().error(f"Conflicts between events {e1}@{p1} and {e2}@{p2}: prohibited")
-                elif instance.conflicts[e1][e2] > 0:
-                    log().warn(f"Soft conflict between events {e1}@{p1} and {e2}@{p2}: {instance.conflicts[e1][e2]}")
-                    cost_components['soft_components']['conflicts'] += instance.conflicts[e1][e2]
-                if instance.roomset_overlap[r1][r2] > 0:
-                    log().error(f"Room clash for events {e1}@{p1}/{r1} and {e2}@{p2}/{r2}")
-                    cost_components['hard_components']['multiple_room_occupation'] += 1
-            # 2. a precedence between events is required
-            if instance.precedence[e1][e2] > 0 and p1 >= p2:
-                cost_components['hard_components']['precedence'] += instance.precedence[e1][e2]
-                log().error(f"Precedence between events {e1}@{p1} and {e2}@{p2} not respected")
-            # 3. distances
-            # 3.1 directional distances
-            if instance.precedence[e1][e2] > 0 and instance.distance_weight[e1][e2] > 0:
-                if instance.min_distances[e1][e2] > 0 and p2 - p1 < instance.min_distances[e1][e2]:
-                    cost_components['soft_components']['min_directional_distance'] += instance.distance_weight[e1][e2] * (instance.min_distances[e1][e2] - (p2 - p1))
-                    log().warn(f"Directional min distance between events {e1}@{p1} and {e2}@{p2} ({instance.min_distances[e1][e2]}) not respected (weight {instance.distance_weight[e1][e2]})")
-                if instance.max_distances[e1][e2] < instance.periods and p2 - p1 > instance.max_distances[e1][e2]:
-                    cost_components['soft_components']['max_directional_distance'] += instance.distance_weight[e1][e2] * ((p2 - p1) - instance.max_distances[e1][e2])
-                    log().warn(f"Directional max distance between events {e1}@{p1} and {e2}@{p2} ({instance.max_distances[e1][e2]}) not respected (weight {instance.distance_weight[e1][e2]})")
-            # 3.2 undirectional distances
-            elif instance.distance_weight[e1][e2] > 0:
-                if instance.min_distances[e1][e2] > 0 and abs(p2 - p1) < instance.min_distances[e1][e2]:
-                    cost_components['soft_components']['min_undirectional_distance'] += instance.distance_weight[e1][e2] * (instance.min_distances[e1][e2] - abs(p2 - p1))
-                    log().warn(f"Min distance between events {e1}@{p1} and {e2}@{p2} ({instance.min_distances[e1][e2]}) not respected (weight {instance.distance_weight[e1][e2]})")
-                if instance.max_distances[e1][e2] < instance.periods and abs(p2 - p1) > instance.max_distances[e1][e2]:
-                    cost_components['soft_components']['max_undirectional_distance'] += instance.distance_weight[e1][e2] * (abs(p2 - p1) - instance.max_distances[e1][e2])
-                    log().warn(f"Max distance between events {e1}@{p1} and {e2}@{p2} ({instance.max_distances[e1][e2]}) not respected (weight {instance.distance_weight[e1][e2]})")
-        # single event
-        for e, (p, r) in enumerate(solution.timetable):
-            p, r = p - 1, r - 1
-            # 4. forbidden periods
-            if instance.event_period_constraints[e][p] == -1:
-                cost_components['hard_components']['forbidden_period'] += 1
-                log().error(f'Event {e}@{p} is assigned to a forbidden period')
-            # 5. forbidden rooms
-            if instance.event_room_constraints[e][r] == -1:
-                cost_components['hard_components']['forbidden_room'] += 1
-                log().error(f'Event {e}@{p}/{r} is assigned to a forbidden room')
-            # 6. period preference costs
-            if instance.event_period_constraints[e][p] > 0:
-                cost_components['soft_components']['period_preference'] += instance.event_period_constraints[e][p]
-                log().warn(f'Event {e}@{p} is assigned to an undesired/not preferred period')
-            # 7. room preference costs
-            if instance.event_room_constraints[e][r] > 0:
-                cost_components['soft_components']['room_preference'] += instance.event_room_constraints[e][r]
-                log().error(f'Event {e}@{p}/{r} is assigned to an undesired/not preferred room')
-        # room
-        for e, (p, r) in enumerate(solution.timetable):
-            p, r = p - 1, r - 1
-            # 8. forbidden rooms in a period
-            if instance.room_period_constraints[r][p] == -1:
-                cost_components['hard_components']['forbidden_room_period'] += 1
-                log().error(f'Event {e}@{p}/{r} is assigned to a room that is forbidden in that period')
-            # 9. undesired rooms in a period
-            elif instance.room_period_constraints[r][p] > 0:
-                cost_components['soft_components']['undesired_room_period'] += 1
-                log().error(f'Event {e}@{p}/{r} is assigned to a room that is undesired in that period')
+        periods = np.array([p for p, _ in solution.timetable], dtype=np.int64).reshape(-1) - 1
+        rooms = np.array([r for _, r in solution.timetable], dtype=np.int64).reshape(-1) - 1
+        cls.timetable_costs(instance, periods, rooms, cost_components)
 
         cost_components['conflicts'] = 0
         cost_components['distances'] = 0
@@ -151,6 +91,90 @@ class SolutionValidator(object):
             'cost': cost
         }
 
+    @classmethod
+    def timetable_costs(cls, instance, periods, rooms, cost_components):
+        '''Accumulates the hard and soft components of a timetable, given as vectors of (0-based) periods and rooms per event'''
+        hard = cost_components['hard_components']
+        soft = cost_components['soft_components']
+        p1, p2 = periods[:, None], periods[None, :]
+        r1, r2 = rooms[:, None], rooms[None, :]
+        # each pair of events once, e1 < e2
+        pairs = np.triu(np.ones((len(periods), len(periods)), dtype=bool), 1)
+
+        # pair of events constraints
+        # 1. they are in the same period
+        same_period = pairs & (p1 == p2)
+        conflicts = instance.conflicts_matrix
+        hard_conflicts = same_period & (conflicts == -1)
+        soft_conflicts = same_period & (conflicts > 0)
+        hard['conflicts'] += int(conflicts[hard_conflicts].sum())
+        soft['conflicts'] += int(conflicts[soft_conflicts].sum())
+        room_clashes = same_period & (instance.roomset_overlap_matrix[r1, r2] > 0)
+        hard['multiple_room_occupation'] += int(room_clashes.sum())
+        for e1, e2 in np.argwhere(hard_conflicts):
+            log().error(f"Conflicts between events {e1}@{periods[e1]} and {e2}@{periods[e2]}: prohibited")
+        for e1, e2 in np.argwhere(soft_conflicts):
+            log().warn(f"Soft conflict between events {e1}@{periods[e1]} and {e2}@{periods[e2]}: {conflicts[e1, e2]}")
+        for e1, e2 in np.argwhere(room_clashes):
+            log().error(f"Room clash for events {e1}@{periods[e1]}/{rooms[e1]} and {e2}@{periods[e2]}/{rooms[e2]}")
+        # 2. a precedence between events is required
+        precedence = instance.precedence_matrix
+        precedences = pairs & (precedence > 0) & (p1 >= p2)
+        hard['precedence'] += int(precedence[precedences].sum())
+        for e1, e2 in np.argwhere(precedences):
+            log().error(f"Precedence between events {e1}@{periods[e1]} and {e2}@{periods[e2]} not respected")
+        # 3. distances
+        weight = instance.distance_weight_matrix
+        min_distances = instance.min_distances_matrix
+        max_distances = instance.max_distances_matrix
+        distance = p2 - p1
+        weighted = pairs & (weight > 0)
+        # 3.1 directional distances
+        directional = weighted & (precedence > 0)
+        # 3.2 undirectional distances
+        undirectional = weighted & ~(precedence > 0)
+        for kind, mask, d in [('directional', directional, distance), ('undirectional', undirectional, np.abs(distance))]:
+            under = mask & (min_distances > 0) & (d < min_distances)
+            over = mask & (max_distances < instance.periods) & (d > max_distances)
+            soft[f'min_{kind}_distance'] += int((weight * (min_distances - d))[under].sum())
+            soft[f'max_{kind}_distance'] += int((weight * (d - max_distances))[over].sum())
+            for e1, e2 in np.argwhere(under):
+                log().warn(f"Min {kind} distance between events {e1}@{periods[e1]} and {e2}@{periods[e2]} ({min_distances[e1, e2]}) not respected (weight {weight[e1, e2]})")
+            for e1, e2 in np.argwhere(over):
+                log().warn(f"Max {kind} distance between events {e1}@{periods[e1]} and {e2}@{periods[e2]} ({max_distances[e1, e2]}) not respected (weight {weight[e1, e2]})")
+
+        # single event
+        events = np.arange(len(periods))
+        period_constraints = instance.event_period_constraints_matrix[events, periods]
+        room_constraints = instance.event_room_constraints_matrix[events, rooms]
+        # 4. forbidden periods
+        hard['forbidden_period'] += int((period_constraints == -1).sum())
+        # 5. forbidden rooms
+        hard['forbidden_room'] += int((room_constraints == -1).sum())
+        # 6. period preference costs
+        soft['period_preference'] += int(period_constraints[period_constraints > 0].sum())
+        # 7. room preference costs
+        soft['room_preference'] += int(room_constraints[room_constraints > 0].sum())
+        for e in np.flatnonzero(period_constraints == -1):
+            log().error(f'Event {e}@{periods[e]} is assigned to a forbidden period')
+        for e in np.flatnonzero(room_constraints == -1):
+            log().error(f'Event {e}@{periods[e]}/{rooms[e]} is assigned to a forbidden room')
+        for e in np.flatnonzero(period_constraints > 0):
+            log().warn(f'Event {e}@{periods[e]} is assigned to an undesired/not preferred period')
+        for e in np.flatnonzero(room_constraints > 0):
+            log().error(f'Event {e}@{periods[e]}/{rooms[e]} is assigned to an undesired/not preferred room')
+
+        # room
+        room_period_constraints = instance.room_period_constraints_matrix[rooms, periods]
+        # 8. forbidden rooms in a period
+        hard['forbidden_room_period'] += int((room_period_constraints == -1).sum())
+        # 9. undesired rooms in a period
+        soft['undesired_room_period'] += int((room_period_constraints > 0).sum())
+        for e in np.flatnonzero(room_period_constraints == -1):
+            log().error(f'Event {e}@{periods[e]}/{rooms[e]} is assigned to a room that is forbidden in that period')
+        for e in np.flatnonzero(room_period_constraints > 0):
+            log().error(f'Event {e}@{periods[e]}/{rooms[e]} is assigned to a room that is undesired in that period')
+
     @classmethod
     def check_assignments(cls, instance, solution, ignore_forbidden):
         for c, assignment in solution.assignments.items():